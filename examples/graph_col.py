@@ -86,9 +86,9 @@ def encoding_propositional(problem):
     for node in nodes:
         problem += Assert(Count({Assign(node, color) for color in colors}) == 1)
 
-    for edge in edges:
-        for color in colors:
-            problem += When(Assign(edge.node1, color)).and_also(Assign(edge.node2, color)).holds(False)
+    # the constraint shape is compiled once and instantiated for each (edge, color) pair
+    edge_not_colored = RuleTemplate(lambda node1, node2, color: When(Assign(node1, color)).and_also(Assign(node2, color)).holds(False))
+    problem += edge_not_colored.render([(edge.node1, edge.node2, color) for edge in edges for color in colors])
 
 
 encoding1(problem=p)
@@ -0,0 +1,121 @@
+import math
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from pyspel.pyspel import Atom, Encoding, Problem, Result, SolverWrapper
+
+
+class RandomNeighborhood:
+
+    def __init__(self, fraction=0.2):
+        if not 0 < fraction <= 1:
+            raise ValueError(f"Expected fraction in (0, 1], got {fraction}")
+        self.fraction = fraction
+
+    def __call__(self, atoms, rng):
+        return rng.sample(atoms, max(1, math.ceil(len(atoms) * self.fraction)))
+
+
+def _occurrences(answer, predicate):
+    name = predicate.predicate.name
+    return [view for view in answer.get_atom_occurrences(predicate, lazy=True) if str(view) == name or str(view).startswith(f"{name}(")]
+
+
+def _better(costs, best):
+    return best is None or costs < best
+
+
+class LNS:
+
+    def __init__(self, problem, predicate, selector=None, workers=None, neighborhood_timeout=5, options=None, solver_path=None, seed=None):
+        if not isinstance(predicate, Atom):
+            raise ValueError("Expected atom as predicate")
+        if isinstance(problem, Problem) and problem.encoding is not None and problem._spool is None and len(problem.rules) == 0:
+            (self.encoding, self._owned) = (problem.encoding, False)
+        else:
+            (self.encoding, self._owned) = (Encoding(str(problem)), True)
+        self._source = problem if isinstance(problem, Problem) else None
+        self.predicate = predicate
+        self.selector = RandomNeighborhood() if selector is None else selector
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.neighborhood_timeout = neighborhood_timeout
+        self.options = [] if options is None else options
+        self.solver = SolverWrapper(solver_path=solver_path)
+        self.rng = random.Random(seed)
+        self.best = None
+        self.history = []
+
+    def _problem(self):
+        if self._source is None:
+            return Problem(encoding=self.encoding)
+        return self._source._derive(self.encoding)
+
+    def _solve(self, problem, timeout, warm_start):
+        options = self.options + [f"--time-limit={math.ceil(timeout)}"]
+        result = self.solver.solve(problem, options=options, timeout=timeout + 10, warm_start=warm_start)
+        if result.status != Result.HAS_SOLUTION:
+            return None
+        return result.answers[-1]
+
+    def _neighborhood(self, best, seed):
+        atoms = _occurrences(best, self.predicate)
+        free = {str(a) for a in self.selector(atoms, random.Random(seed))}
+        problem = self._problem()
+        problem += "".join([f":- not {a}.\n" for a in atoms if str(a) not in free])
+        return self._solve(problem, self.neighborhood_timeout, best)
+
+    def initial(self, answer=None):
+        if answer is None:
+            answer = self._solve(self._problem(), self.neighborhood_timeout, None)
+            if answer is None:
+                raise ValueError("No initial solution found for large neighborhood search")
+        self._improve(answer)
+        return answer
+
+    def _improve(self, answer):
+        if answer is None or not _better(answer.costs, None if self.best is None else self.best.costs):
+            return False
+        self.best = answer
+        self.history.append((monotonic(), answer.costs))
+        return True
+
+    def run(self, timeout=None, iterations=None, initial=None):
+        if timeout is None and iterations is None:
+            raise ValueError("Expected a timeout or a number of iterations for large neighborhood search")
+        start = monotonic()
+        if self.best is None or initial is not None:
+            self.initial(initial)
+        rounds = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while iterations is None or rounds < iterations:
+                if timeout is not None and monotonic() - start + self.neighborhood_timeout > timeout:
+                    break
+                best = self.best
+                seeds = [self.rng.getrandbits(32) for _ in range(self.workers)]
+                for answer in executor.map(lambda s: self._neighborhood(best, s), seeds):
+                    self._improve(answer)
+                rounds += 1
+                if len(self.best.costs) != 0 and all(c == 0 for c in self.best.costs):
+                    break
+        result = Result(Result.HAS_SOLUTION)
+        result.add_answer(self.best)
+        return result
+
+    def close(self):
+        if self._owned:
+            self.encoding.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+def lns(problem, predicate, timeout=None, iterations=None, initial=None, **kwargs):
+    with LNS(problem, predicate, **kwargs) as search:
+        return search.run(timeout=timeout, iterations=iterations, initial=initial)
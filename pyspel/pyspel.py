@@ -1,3 +1,9 @@
+import abc
+import gzip
+import hashlib
+import inspect
+import itertools
+import re
 import subprocess
 import sys
 import tempfile
@@ -6,7 +12,13 @@ from dataclasses import dataclass
 from dataclasses import field
 import os
 import json
-from time import sleep
+import queue
+import zlib
+import bisect
+import contextvars
+import threading
+from array import array
+from time import sleep, monotonic
 from types import FunctionType, CodeType
 from typing import Any, ClassVar
 
@@ -14,6 +26,24 @@ __version__ = "1.0.2"
 
 invalid_exit_codes = {1, 65}
 
+_wire_magic = b"PYSPEL"
+_wire_version = 2
+
+_variable_ids = itertools.count()
+_min_integer = -2 ** 31
+_max_integer = 2 ** 31 - 1
+_symbolic_constant = re.compile(r'^[a-z][A-Za-z0-9_\']*$')
+_variable_name = re.compile(r'^[A-Z][A-Za-z0-9_\']*$')
+_anonymous_variables = re.compile(r'"(?:[^"\\]|\\.)*"|\bX_\d+\b')
+_variables = re.compile(r'"(?:[^"\\]|\\.)*"|\b[A-Z][A-Za-z0-9_\']*|(?<![A-Za-z0-9_\'])_(?![A-Za-z0-9_\'])')
+_interned_symbol = "_pyspel_s("
+_string_literal = re.compile(r'"(?:[^"\\]|\\.)*"')
+_comparison = re.compile(r'^(.*?) (<=|>=|!=|<|>|=) (.*)$')
+_answer_atoms = re.compile(r'(?:[^\s"]|"(?:[^"\\]|\\.)*")+')
+_arithmetic = re.compile(r' [-+*/\\] |\*\*|\.\.|\|')
+_template_parameters = re.compile("\x00(\\d+)\x00")
+_rule_tokens = re.compile(r'"(?:[^"\\]|\\.)*"|#[a-z]+|[A-Z_][A-Za-z0-9_\']*|[a-z][A-Za-z0-9_\']*|\d+|\.\.|:-|:~|[<>=!]=?|\s+|.')
+
 
 def abs_v(value):
     return Term(ObjectVariable(f'|{value}|'))
@@ -56,47 +86,476 @@ def _get_terms(predicate_name, atom_name):
     return elements
 
 
-def _run_solver(rules, solver_path, options, timeout):
-    filename = tempfile.gettempdir() + os.path.sep + "pyspel_tmp_program_%s" % uuid.uuid4()
-    output_filename = tempfile.gettempdir() + os.path.sep + "pyspel_tmp_program_%s.json" % uuid.uuid4()
-    with open(filename, "w+") as f:
-        f.write(rules)
-        f.close()
-    out = open(output_filename, "w")
+_latency_buckets = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+
+
+class Metrics:
+
+    def __init__(self, buckets=_latency_buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = [[0] * (len(self.buckets) + 1), 0, 0]
+                self.histograms[key] = histogram
+            histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_json(self):
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value} for ((name, labels), value) in self.counters.items()]
+            histograms = []
+            for ((name, labels), (counts, total, count)) in self.histograms.items():
+                cumulative = list(itertools.accumulate(counts))
+                histograms.append({"name": name, "labels": dict(labels), "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], cumulative)),
+                                   "sum": total, "count": count})
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name in sorted({name for (name, labels) in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for ((n, labels), value) in self.counters.items():
+                    if n == name:
+                        lines.append(f"{name}{_prometheus_labels(labels)} {value}")
+            for name in sorted({name for (name, labels) in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for ((n, labels), (counts, total, count)) in self.histograms.items():
+                    if n != name:
+                        continue
+                    for (bound, cumulative) in zip(list(self.buckets) + ["+Inf"], itertools.accumulate(counts)):
+                        lines.append(f"{name}_bucket{_prometheus_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_prometheus_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_prometheus_labels(labels)} {count}")
+        return "".join([f"{line}\n" for line in lines])
+
+    def export(self, filename, format=None):
+        if format is None:
+            format = "json" if filename.endswith(".json") else "prometheus"
+        if format == "json":
+            text = json.dumps(self.to_json(), indent=2)
+        elif format == "prometheus":
+            text = self.to_prometheus()
+        else:
+            raise ValueError(f"Expected json or prometheus format, got {format}")
+        tmp = f"{filename}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, filename)
+
+
+def _prometheus_labels(labels):
+    if len(labels) == 0:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for (k, v) in labels]
+    return "{%s}" % ",".join([f'{k}="{v}"' for (k, v) in escaped])
+
+
+class TraceHook:
+
+    def on_start(self, stage, info):
+        pass
+
+    def on_end(self, stage, elapsed, info):
+        pass
+
+
+_trace_hooks = []
+_metrics = None
+
+
+def add_trace_hook(hook):
+    global _trace_hooks
+    if not isinstance(hook, TraceHook):
+        raise ValueError(f"Expected trace hook, got {type(hook)}")
+    _trace_hooks = _trace_hooks + [hook]
+    return hook
+
+
+def remove_trace_hook(hook):
+    global _trace_hooks
+    _trace_hooks = [h for h in _trace_hooks if h is not hook]
+
+
+def enable_metrics(buckets=_latency_buckets):
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(buckets)
+    return _metrics
+
+
+def disable_metrics():
+    global _metrics
+    _metrics = None
+
+
+def get_metrics():
+    return _metrics
+
+
+class _Span:
+    __slots__ = ("stage", "info", "start", "hooks", "metrics")
+
+    def __init__(self, stage, info, hooks, metrics):
+        self.stage = stage
+        self.info = info
+        self.hooks = hooks
+        self.metrics = metrics
+
+    def set(self, **info):
+        self.info.update(info)
+
+    def __enter__(self):
+        for hook in self.hooks:
+            hook.on_start(self.stage, self.info)
+        self.start = monotonic()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        elapsed = monotonic() - self.start
+        if type is not None:
+            self.info["error"] = type.__name__
+        if self.metrics is not None:
+            self.metrics.observe("pyspel_stage_seconds", elapsed, stage=self.stage)
+            for (key, value) in self.info.items():
+                if value.__class__ is int:
+                    self.metrics.increment(f"pyspel_{key}_total", value, stage=self.stage)
+        for hook in self.hooks:
+            hook.on_end(self.stage, elapsed, self.info)
+        return False
+
+
+class _NullSpan:
+
+    def set(self, **info):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def _span(stage, **info):
+    if _metrics is None and len(_trace_hooks) == 0:
+        return _null_span
+    return _Span(stage, info, _trace_hooks, _metrics)
+
+
+def _tmp_filename(suffix=""):
+    return tempfile.gettempdir() + os.path.sep + "pyspel_tmp_program_%s%s" % (uuid.uuid4(), suffix)
+
+
+def _parse_term(term):
+    if term.startswith('"'):
+        return term[1:-1]
+    if term.startswith(_interned_symbol):
+        table = _decoding.get(None)
+        if table is not None:
+            return table.decode(term)
+    try:
+        return int(term)
+    except ValueError:
+        return eval(term)
+
+
+def _rename_variables(rule, names=None):
+    if names is None:
+        names = {}
+
+    def rename(match):
+        name = match.group(0)
+        if name[0] == '"':
+            return name
+        if name not in names:
+            names[name] = f"X{len(names)}"
+        return names[name]
+
+    return _anonymous_variables.sub(rename, rule)
+
+
+def _feed(fd, chunks):
+    with os.fdopen(fd, "wb") as pipe:
+        try:
+            for chunk in chunks:
+                pipe.write(chunk)
+        except BrokenPipeError:
+            pass
+
+
+def _start_solver(rules, solver_path, options, files, stdin, stdout, stderr, text=False):
+    filename = _tmp_filename()
+    with _span("write") as span:
+        with open(filename, "w+") as f:
+            f.write(rules)
+        span.set(bytes=os.path.getsize(filename))
 
     if solver_path is None:
         commands = ["clingo"]
     else:
         commands = [solver_path]
     commands.extend(options)
+    if files is not None:
+        commands.extend(files)
+    if stdin is not None:
+        commands.append("-")
     commands.append(filename)
-    solver = subprocess.Popen(commands, stdin=None, stdout=out, stderr=subprocess.PIPE)
+    if stdin is None:
+        with _span("spawn"):
+            return subprocess.Popen(commands, stdin=None, stdout=stdout, stderr=stderr, text=text), filename
+    if isinstance(stdin, str):
+        stdin = [stdin.encode()]
+    (read_fd, write_fd) = os.pipe()
+    try:
+        with _span("spawn"):
+            solver = subprocess.Popen(commands, stdin=read_fd, stdout=stdout, stderr=stderr, text=text)
+    except Exception:
+        os.close(write_fd)
+        raise
+    finally:
+        os.close(read_fd)
+    threading.Thread(target=_feed, args=(write_fd, stdin), daemon=True).start()
+    return solver, filename
+
+
+def _run_solver(rules, solver_path, options, timeout, files=None, stdin=None):
+    output_filename = _tmp_filename(".json")
+    out = open(output_filename, "w")
+    (solver, filename) = _start_solver(rules, solver_path, options, files, stdin, stdout=out, stderr=subprocess.PIPE)
     killed = False
     exit_code = 1
-    try:
-        stdout, stderr = solver.communicate(timeout=timeout)
-    except subprocess.TimeoutExpired:
-        solver.terminate()
-        sleep(3)
-        solver.kill()
-        stdout, stderr = solver.communicate()
-        exit_code = 11
-        killed = True
+    with _span("solver") as span:
+        try:
+            stdout, stderr = solver.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            solver.terminate()
+            sleep(3)
+            solver.kill()
+            stdout, stderr = solver.communicate()
+            exit_code = 11
+            killed = True
+            span.set(timeouts=1)
     out.close()
 
     if not killed:
         exit_code = solver.returncode
     os.remove(filename)
     output = ""
-    with open(output_filename, "r") as o:
-        output = "\n".join(o.readlines())
+    with _span("read") as span:
+        span.set(bytes=os.path.getsize(output_filename))
+        with open(output_filename, "r") as o:
+            output = o.read()
     os.remove(output_filename)
     return output, stderr.decode(), exit_code, killed
 
 
+def _stream_solver(rules, solver_path, options, timeout, on_line, on_tick, files=None, stdin=None, poll=0.1):
+    err = tempfile.TemporaryFile()
+    (solver, filename) = _start_solver(rules, solver_path, options, files, stdin, stdout=subprocess.PIPE, stderr=err, text=True)
+
+    def read():
+        for read_line in solver.stdout:
+            lines.put(read_line.rstrip("\n"))
+        lines.put(None)
+
+    lines = queue.Queue()
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+
+    start = monotonic()
+    killed = False
+    stopped = False
+    while True:
+        elapsed = monotonic() - start
+        if timeout is not None and elapsed >= timeout:
+            killed = True
+            break
+        try:
+            line = lines.get(timeout=poll)
+        except queue.Empty:
+            if on_tick(monotonic() - start):
+                stopped = True
+                break
+            continue
+        if line is None:
+            break
+        if on_line(line, monotonic() - start):
+            stopped = True
+            break
+
+    if killed or stopped:
+        solver.terminate()
+        try:
+            solver.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            solver.kill()
+    solver.wait()
+    reader.join()
+    exit_code = 11 if killed else solver.returncode
+    err.seek(0)
+    stderr = err.read().decode()
+    err.close()
+    os.remove(filename)
+    return stderr, exit_code, killed, stopped
+
+
+def _program_inputs(program):
+    with _span("serialize") as span:
+        if isinstance(program, Problem) or isinstance(program, _ExtendedProgram) or isinstance(program, _DialectProgram):
+            inputs = program._inputs()
+        else:
+            inputs = (str(program), None, None)
+        span.set(chars=len(inputs[0]))
+    return inputs
+
+
+class _ExtendedProgram:
+
+    def __init__(self, program, rules):
+        self.program = program
+        self.rules = rules
+
+    def _inputs(self):
+        if isinstance(self.program, Problem):
+            (rules, files, stdin) = self.program._inputs()
+        else:
+            (rules, files, stdin) = (str(self.program), None, None)
+        return rules + self.rules, files, stdin
+
+    def __str__(self):
+        return str(self.program) + self.rules
+
+
+def _negated_builtin(tokens, start):
+    depth = 0
+    for i in range(start, len(tokens)):
+        token = tokens[i]
+        if token in ("(", "{", "["):
+            depth += 1
+        elif token in (")", "}", "]"):
+            depth -= 1
+            if depth < 0:
+                return None
+        elif depth == 0 and token in (",", ";", ".", ":"):
+            return None
+        elif depth == 0 and token in _negated_comparison:
+            return i
+    return None
+
+
+def _core_dialect(text):
+    tokens = _rule_tokens.findall(text)
+    result = []
+    depth = 0
+    body = False
+    comment = False
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if comment:
+            result.append(token)
+            comment = "\n" not in token
+            continue
+        if token == "%":
+            comment = True
+        elif token in ("(", "{", "["):
+            depth += 1
+        elif token in (")", "}", "]"):
+            depth -= 1
+        elif depth == 0 and token in (":-", ":~"):
+            body = True
+        elif depth == 0 and token == ".":
+            body = False
+        elif depth == 0 and token == ":":
+            raise ValueError("Conditional literals are not supported by ASP-Core-2")
+        elif token == ".." or token == "\\" or (token == "*" and i < len(tokens) and tokens[i] == "*"):
+            raise ValueError(f"Operator {token if token != '*' else '**'} is not supported by ASP-Core-2")
+        elif token == "|" and (body or depth != 0):
+            raise ValueError("Absolute values are not supported by ASP-Core-2")
+        elif depth == 0 and token == ";":
+            token = "," if body else "|"
+        elif token == "not":
+            operator = _negated_builtin(tokens, i)
+            if operator is not None:
+                tokens[operator] = _negated_comparison[tokens[operator]]
+                while i < len(tokens) and tokens[i].isspace():
+                    i += 1
+                continue
+        elif token == "!=":
+            token = "<>"
+        elif token == "#true":
+            token = "0 = 0"
+        result.append(token)
+    return "".join(result)
+
+
+class _DialectProgram:
+
+    def __init__(self, program, dialect):
+        self.program = program
+        self.dialect = dialect
+
+    def _inputs(self):
+        if isinstance(self.program, Problem) or isinstance(self.program, _ExtendedProgram):
+            (rules, files, stdin) = self.program._inputs()
+        else:
+            (rules, files, stdin) = (str(self.program), None, None)
+        if self.dialect == Problem.GRINGO:
+            return rules, files, stdin
+        texts = []
+        for chunk in [] if stdin is None else stdin:
+            texts.append(chunk.decode())
+        for filename in [] if files is None else files:
+            with open(filename, "r") as f:
+                texts.append(f.read())
+        texts.append(rules)
+        return _core_dialect("\n".join(texts)), None, None
+
+    def __str__(self):
+        if self.dialect == Problem.GRINGO:
+            return str(self.program)
+        return _core_dialect(str(self.program))
+
+
+def _warm_start_hints(answer):
+    if isinstance(answer, Answer):
+        atoms = answer._answer_set
+    else:
+        atoms = [str(a) for a in answer]
+    return "".join([f"#heuristic {a}. [1, true]\n" for a in atoms])
+
+
+def _run_program(program, solver_path, options, timeout):
+    (rules, files, stdin) = _program_inputs(program)
+    return _run_solver(rules, solver_path, options, timeout=timeout, files=files, stdin=stdin)
+
+
 @dataclass(frozen=True)
 class ObjectVariable:
-    value: str = field(default_factory=lambda: f'X{uuid.uuid4().hex}')
+    value: str = field(default_factory=lambda: f'X_{next(_variable_ids)}')
 
     def __str__(self):
         return self.value
@@ -105,14 +564,88 @@ class ObjectVariable:
         return self.__str__()
 
 
+def _fold(value):
+    if isinstance(value, Term):
+        value = value.value
+    if isinstance(value, Expression):
+        return value.fold()
+    return value
+
+
+def _fold_integers(left, operator, right):
+    if operator == "+":
+        result = left + right
+    elif operator == "-":
+        result = left - right
+    elif operator == "*":
+        result = left * right
+    elif operator == "/" or operator == "\\":
+        if right == 0:
+            return None
+        result = abs(left) // abs(right)
+        if (left < 0) != (right < 0):
+            result = -result
+        if operator == "\\":
+            result = left - right * result
+    elif operator == "**":
+        if right < 0 or right > 64:
+            return None
+        result = left ** right
+    else:
+        return None
+    if result < _min_integer or result > _max_integer:
+        return None
+    return result
+
+
+def _render_operand(value):
+    if isinstance(value, Expression):
+        return value._text()
+    return str(value)
+
+
+@dataclass(frozen=True, eq=False)
+class Expression:
+    operator: str
+    left: Any
+    right: Any
+
+    def fold(self):
+        left = _fold(self.left)
+        right = _fold(self.right)
+        if left.__class__ is int and right.__class__ is int:
+            result = _fold_integers(left, self.operator, right)
+            if result is not None:
+                return result
+        return Expression(self.operator, left, right)
+
+    def _text(self):
+        return f"({_render_operand(self.left)} {self.operator} {_render_operand(self.right)})"
+
+    def __str__(self):
+        return _render_operand(self.fold())
+
+    def __repr__(self):
+        return self.__str__()
+
+
 @dataclass(frozen=True)
 class Term:
     value: Any = field(default_factory=lambda: ObjectVariable())
 
     def __str__(self):
         assert self.value is not None
+        if self.value.__class__ is int:
+            return str(self.value)
         if isinstance(self.value, str):
+            table = _interning.get(None)
+            if table is not None:
+                return table.symbol(self.value)
             return f'"{self.value}"'
+        if self.value.__class__ is tuple:
+            table = _interning.get(None)
+            if table is not None:
+                return table.symbol(self.value)
         return str(self.value)
 
     def __repr__(self):
@@ -120,11 +653,11 @@ class Term:
 
     @classmethod
     def _op(cls, term1, term2, operator):
-        return Literal(Atom(Predicate(f"{term1} {operator} {term2}")), True)
+        return Literal(Comparison(term1, operator, term2), True)
 
     @classmethod
     def _arithmetic(cls, term1, term2, operator):
-        return Term(ObjectVariable(value=f"({term1} {operator} {term2})"))
+        return Term(Expression(operator, term1, term2))
 
     def __eq__(self, other):
         return Term._op(self, other, "=")
@@ -215,14 +748,7 @@ class Atom:
         terms = []
         for term in self.__dict__:
             if isinstance(self.__dict__[term], Term):
-                if my_terms[i].startswith('"'):
-                    terms.append(my_terms[i][1:-1])
-                else:
-                    try:
-                        element = int(my_terms[i])
-                    except ValueError:
-                        element = eval(my_terms[i])
-                    terms.append(element)
+                terms.append(_parse_term(my_terms[i]))
                 i += 1
             elif isinstance(self.__dict__[term], Atom):
                 terms.append(self.__dict__[term].create_atom_from_str(my_terms[i]))
@@ -255,12 +781,10 @@ class Atom:
         return obj
 
     def __str__(self):
-        terms = []
-        for term in self.__dict__:
-            if isinstance(self.__dict__[term], Term):
-                terms.append(f"{self.__dict__[term]}")
-            elif isinstance(self.__dict__[term], Atom):
-                terms.append(str(self.__dict__[term]))
+        table = _interning.get(None)
+        if table is not None:
+            table.observe(self)
+        terms = [str(value) for value in self.__dict__.values() if isinstance(value, Term) or isinstance(value, Atom)]
 
         res = self.predicate.name
         if len(terms) > 0:
@@ -285,6 +809,375 @@ class Atom:
     def __exit__(self, type, value, traceback):
         pass
 
+    def __reduce_ex__(self, protocol):
+        data = _atom_data(self)
+        if data is None:
+            return object.__reduce_ex__(self, protocol)
+        return _load_atom, (data,)
+
+
+def _atom_data(atom_, ground=False):
+    if type(atom_) is Atom or isinstance(atom_, (Aggregate, Comparison)) or not isinstance(atom_, Atom):
+        return None
+    name = type(atom_).__name__
+    if globals().get(name) is not type(atom_):
+        return None
+    fields = {}
+    for (key, value) in atom_.__dict__.items():
+        if isinstance(value, Predicate):
+            continue
+        if isinstance(value, Atom):
+            nested = _atom_data(value, ground)
+            if nested is None:
+                return None
+            fields[key] = nested
+            continue
+        while isinstance(value, Term):
+            value = value.value
+        if value.__class__ is int or value.__class__ is str:
+            fields[key] = value
+        elif isinstance(value, ObjectVariable) and not ground:
+            fields[key] = {"variable": value.value}
+        else:
+            return None
+    return {"atom": name, "fields": fields}
+
+
+def _atom_class(data):
+    if not isinstance(data, dict) or not isinstance(data.get("atom"), str) or not isinstance(data.get("fields"), dict):
+        raise ValueError("Expected serialized atom")
+    cls = globals().get(data["atom"])
+    if not isinstance(cls, type) or not issubclass(cls, Atom) or cls is Atom:
+        return None
+    if list(data["fields"]) != list(getattr(cls, '__annotations__', {})):
+        raise ValueError(f"Serialized fields of {data['atom']} do not match the atom class")
+    for value in data["fields"].values():
+        if isinstance(value, dict) and "variable" not in value and _atom_class(value) is None:
+            return None
+    return cls
+
+
+def _field_value(value):
+    if isinstance(value, dict):
+        if "variable" in value:
+            if not isinstance(value["variable"], str):
+                raise ValueError("Expected str for serialized variable")
+            return Term(ObjectVariable(value["variable"]))
+        return _load_atom(value)
+    if value.__class__ is not int and value.__class__ is not str:
+        raise ValueError(f"Unexpected serialized value of type {type(value)}")
+    return value
+
+
+def _load_atom(data):
+    cls = _atom_class(data)
+    if cls is None:
+        raise ValueError(f"Unknown atom {data['atom']}, did you forget the annotation @atom?")
+    return cls(**{key: _field_value(value) for (key, value) in data["fields"].items()})
+
+
+def _render_atom_data(data):
+    name = data["atom"][0].lower() + data["atom"][1:]
+    if len(data["fields"]) == 0:
+        return name
+    args = []
+    for value in data["fields"].values():
+        if isinstance(value, dict):
+            args.append(_render_atom_data(value))
+        elif value.__class__ is str:
+            args.append('"%s"' % value)
+        else:
+            args.append(str(value))
+    return "%s(%s)" % (name, ", ".join(args))
+
+
+def _policy_data(policy):
+    if policy is None or isinstance(policy, str):
+        return policy
+    name = type(policy).__name__
+    if globals().get(name) is not type(policy):
+        return str(policy)
+    return {"policy": name, "arguments": {k: v for (k, v) in policy.__dict__.items() if not k.startswith("_")}}
+
+
+def _load_policy(data):
+    if data is None or isinstance(data, str):
+        return data
+    cls = globals().get(data.get("policy"))
+    if not isinstance(cls, type) or not issubclass(cls, StoppingPolicy):
+        raise ValueError(f"Unknown stopping policy {data.get('policy')}")
+    return cls(**data["arguments"])
+
+
+def _wire_dumps(kind, payload, compress):
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    if compress:
+        data = zlib.compress(data)
+    return _wire_magic + bytes([_wire_version, kind, int(compress)]) + data
+
+
+def _wire_loads(kind, data):
+    header = len(_wire_magic)
+    if data[:header] != _wire_magic:
+        raise ValueError("Expected pyspel serialized data")
+    if data[header] != _wire_version:
+        raise ValueError(f"Unsupported pyspel serialization version {data[header]}")
+    if data[header + 1] != kind:
+        raise ValueError(f"Expected serialized {chr(kind)}, got {chr(data[header + 1])}")
+    payload = data[header + 3:]
+    if data[header + 2]:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+class AtomView:
+    __slots__ = ("_atom", "_text", "_python_class", "_constants", "_terms", "_values")
+    __fields = {}
+
+    def __init__(self, atom_, text, python_class=False, constants=None):
+        self._atom = atom_
+        self._text = text
+        self._python_class = python_class
+        self._constants = constants
+        self._terms = None
+        self._values = {}
+
+    @classmethod
+    def _fields(cls, atom_):
+        fields = cls.__fields.get(type(atom_))
+        if fields is None:
+            fields = {}
+            for name, value in atom_.__dict__.items():
+                if isinstance(value, Term) or isinstance(value, Atom):
+                    fields[name] = len(fields)
+            cls.__fields[type(atom_)] = fields
+        return fields
+
+    @property
+    def predicate(self):
+        return self._atom.predicate
+
+    def __getattr__(self, name):
+        values = self._values
+        if name in values:
+            return values[name]
+        index = AtomView._fields(self._atom).get(name)
+        if index is None:
+            raise AttributeError(f"{type(self._atom).__name__} has no attribute {name}")
+        if self._terms is None:
+            self._terms = _get_terms(predicate_name=self._atom.predicate.name, atom_name=self._text)
+        template = self._atom.__dict__[name]
+        if isinstance(template, Atom):
+            value = AtomView(template, self._terms[index], self._python_class, self._constants)
+        else:
+            with _Interning(self._constants, _decoding):
+                value = _parse_term(self._terms[index])
+            if not self._python_class:
+                value = Term(value)
+        values[name] = value
+        return value
+
+    def to_atom(self):
+        with _Interning(self._constants, _decoding):
+            return self._atom.create_atom_from_str(self._text)
+
+    def to_python_class(self):
+        return self.to_atom().to_python_class()
+
+    def __str__(self):
+        return self._text
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class Registry:
+
+    def __init__(self):
+        self._atoms = {}
+        self._tokens = []
+
+    @classmethod
+    def current(cls):
+        registry = _registry.get(None)
+        if registry is None:
+            registry = Registry()
+            _registry.set(registry)
+        return registry
+
+    def store(self, atom_class, name, atom_):
+        self._atoms[(atom_class, name)] = atom_
+
+    def load(self, atom_class, name):
+        return self._atoms.get((atom_class, name))
+
+    def clear(self):
+        self._atoms.clear()
+
+    def __enter__(self):
+        self._tokens.append(_registry.set(self))
+        return self
+
+    def __exit__(self, type, value, traceback):
+        _registry.reset(self._tokens.pop())
+
+
+_registry = contextvars.ContextVar("pyspel_registry")
+
+
+class _ConstantTable:
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def intern(self, value):
+        i = self._ids.get(value)
+        if i is None:
+            with self._lock:
+                i = self._ids.get(value)
+                if i is None:
+                    i = len(self.values)
+                    self.values.append(value)
+                    self._ids[value] = i
+        return i
+
+    def symbol(self, value):
+        return f"{_interned_symbol}{self.intern(value)})"
+
+    def observe(self, atom_):
+        annotations = getattr(type(atom_), '__annotations__', {})
+        for (name, value) in atom_.__dict__.items():
+            if isinstance(value, Term) and annotations.get(name) is any and value.value.__class__ in (str, tuple):
+                self._positions[(atom_.predicate.name, name)] = str
+
+    def decode(self, symbol):
+        i = symbol[len(_interned_symbol):-1]
+        if not i.isdigit() or int(i) >= len(self.values):
+            raise ValueError(f"Unknown interned constant {symbol}")
+        return self.values[int(i)]
+
+    def check_order(self, body):
+        variables = set()
+        comparisons = []
+        for element in body:
+            atom_ = element.atom if isinstance(element, Literal) else element
+            if isinstance(atom_, Comparison):
+                if atom_.operands[1] not in ("=", "!="):
+                    comparisons.append(atom_.operands)
+            elif isinstance(atom_, Atom):
+                self._string_variables(atom_, variables)
+        for (left, operator, right) in comparisons:
+            for operand in (left, right):
+                while isinstance(operand, Term):
+                    operand = operand.value
+                if isinstance(operand, ObjectVariable) and operand.value in variables:
+                    raise ValueError(f"Cannot compare interned constants with {operator}")
+
+    def _string_variables(self, atom_, variables):
+        annotations = getattr(type(atom_), '__annotations__', {})
+        for (name, value) in atom_.__dict__.items():
+            if isinstance(value, Atom):
+                self._string_variables(value, variables)
+                continue
+            while isinstance(value, Term):
+                value = value.value
+            kind = annotations.get(name)
+            if isinstance(value, ObjectVariable) and (kind is str or kind is tuple or (kind is any and self._positions.get((atom_.predicate.name, name)) is str)):
+                variables.add(value.value)
+
+
+_interning = contextvars.ContextVar("pyspel_interning")
+_decoding = contextvars.ContextVar("pyspel_decoding")
+
+
+class _Interning:
+
+    def __init__(self, table, variable=_interning):
+        self.table = table
+        self.variable = variable
+        self._token = None
+
+    def __enter__(self):
+        if self.table is not None:
+            self._token = self.variable.set(self.table)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self._token is not None:
+            self.variable.reset(self._token)
+            self._token = None
+
+
+def _program_constants(program):
+    while isinstance(program, _ExtendedProgram) or isinstance(program, _DialectProgram):
+        program = program.program
+    if isinstance(program, Problem):
+        return program._constants
+    return None
+
+
+def _check_interned_text(text):
+    if _string_literal.search(text) is not None:
+        raise ValueError("Cannot intern string constants written as text, use atoms or a problem without intern")
+
+
+def _constant(value):
+    if isinstance(value, Term):
+        value = _fold(value.value)
+        if value.__class__ is str:
+            return 2, value
+    elif value.__class__ is str:
+        if _symbolic_constant.match(value):
+            return 1, value
+        return None
+    else:
+        value = _fold(value)
+    if value.__class__ is int:
+        return 0, value
+    return None
+
+
+class Comparison(Atom):
+
+    def __init__(self, left, operator, right):
+        Atom.__init__(self, Predicate(f"{left} {operator} {right}"))
+        self.__operands = (left, operator, right)
+
+    @property
+    def operands(self):
+        return self.__operands
+
+    def __str__(self):
+        if _interning.get(None) is None:
+            return self.predicate.name
+        (left, operator, right) = self.__operands
+        if operator not in ("=", "!=") and any(isinstance(t, Term) and (t.value.__class__ is str or t.value.__class__ is tuple) for t in (left, right)):
+            raise ValueError(f"Cannot compare interned constants with {operator}")
+        return f"{left} {operator} {right}"
+
+    def holds(self):
+        (left, operator, right) = self.__operands
+        left = _constant(left)
+        right = _constant(right)
+        if left is None or right is None:
+            return None
+        if operator == "=":
+            return left == right
+        if operator == "!=":
+            return left != right
+        if operator == "<":
+            return left < right
+        if operator == "<=":
+            return left <= right
+        if operator == ">":
+            return left > right
+        if operator == ">=":
+            return left >= right
+        return None
+
 
 class Literal:
 
@@ -295,10 +1188,26 @@ class Literal:
         else:
             self.__polarity = 'not '
 
+    @property
+    def atom(self):
+        return self.__atom
+
+    @property
+    def positive(self):
+        return self.__polarity == ''
+
     def __invert__(self):
         self.__polarity += 'not '
         return self
 
+    def holds(self):
+        if not isinstance(self.__atom, Comparison):
+            return None
+        value = self.__atom.holds()
+        if value is None:
+            return None
+        return value == (self.__polarity.count('not ') % 2 == 0)
+
     def __str__(self):
         return self.__polarity + str(self.__atom)
 
@@ -311,6 +1220,12 @@ class ConditionalLiteral:
     def __init__(self, elements_):
         self.__elements = elements_
 
+    @property
+    def elements(self):
+        if isinstance(self.__elements, list):
+            return self.__elements
+        return [self.__elements]
+
     @classmethod
     def _process_dict(cls, element_):
         if not isinstance(element_, dict):
@@ -368,7 +1283,7 @@ class Aggregate(Atom):
             elements = [{element: self.aggregate_set[element]} for element in self.aggregate_set]
             return "#%s{%s}%s%s" % (self.aggregate_type, str(ConditionalLiteral(elements)), op_, bound_)
         else:
-            return "#%s%s%s%s" % (self.aggregate_type, self.aggregate_set, op_, bound_)
+            return "#%s{%s}%s%s" % (self.aggregate_type, ", ".join(sorted([str(el) for el in self.aggregate_set])), op_, bound_)
 
     def __repr__(self):
         return str(self)
@@ -426,10 +1341,35 @@ class Max(Aggregate):
         Aggregate.__init__(self, aggregate_set=elements, aggregate_type="max")
 
 
+_package_directory = os.path.dirname(os.path.abspath(__file__))
+_record_sources = False
+
+
+def enable_rule_sources():
+    global _record_sources
+    _record_sources = True
+
+
+def disable_rule_sources():
+    global _record_sources
+    _record_sources = False
+
+
+def _caller_source():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_package_directory) and not filename.startswith("<pyspel|"):
+            return filename, frame.f_lineno
+        frame = frame.f_back
+    return None
+
+
 class Definition:
 
     def __init__(self):
         self._body = []
+        self.source = _caller_source() if _record_sources else None
 
     def when(self, *condition):
         assert isinstance(condition, tuple)
@@ -456,23 +1396,53 @@ class Definition:
     def get_head(self):
         raise ValueError("Cannot use get_head of Definition class. Use Guess, Define, or Assert")
 
+    def _simplified_body(self):
+        body = []
+        for element in self._body:
+            if isinstance(element, Literal) or isinstance(element, Comparison):
+                holds = element.holds()
+                if holds is False:
+                    return None
+                if holds is True:
+                    continue
+            body.append(str(element))
+        return "; ".join(body)
+
     def check(self, solver_path=None):
+        (decided, errors, warnings) = _check_rules([self])
+        if len(errors) != 0:
+            raise ValueError("ASP Error: %s" % "\n".join(errors))
+        if decided:
+            return self
         (stdout, stderr, exit_code, killed) = _run_solver(rules=str(self), solver_path=solver_path, options=["--text"], timeout=None)
         if exit_code in invalid_exit_codes:
             raise ValueError(f"ASP Error: {stderr}")
         return self
 
-    def __str__(self):
+    def _render(self):
+        body = self._simplified_body()
+        if body is None:
+            return ""
         head = self.get_head()
         if head is None:
             head = ""
+            if body == "":
+                body = "#true"
         separator = ""
-        body = self.get_body()
         if body != "":
             separator = " :- "
 
         return f"{head}{separator}{body}."
 
+    def __str__(self):
+        table = _interning.get(None)
+        if table is not None:
+            table.check_order(self._body)
+        text = self._render()
+        if "X_" not in text:
+            return text
+        return _rename_variables(text)
+
     def __repr__(self):
         return str(self)
 
@@ -500,7 +1470,7 @@ class Guess(Definition):
 
     def get_head(self):
         if isinstance(self._head, set):
-            tmp = ';'.join([str(el) for el in self._head])
+            tmp = ';'.join(sorted([str(el) for el in self._head]))
             my_head = f"{{{tmp}}}"
         else:
             my_head = f"{{{self._head}}}"
@@ -572,11 +1542,16 @@ class Assert(Definition):
             self.terms.append(str(i))
         return self
 
-    def __str__(self):
+    def _render(self):
         if self._soft:
-            return f" :~ {self.get_body()}. [{self.weight}@{self.level}, {','.join(self.terms)}]"
+            body = self._simplified_body()
+            if body is None:
+                return ""
+            if body == "":
+                body = "#true"
+            return f" :~ {body}. [{self.weight}@{self.level}, {','.join(self.terms)}]"
         else:
-            return Definition.__str__(self)
+            return Definition._render(self)
 
 
 class When:
@@ -600,18 +1575,1269 @@ class When:
         return Guess(head, exactly, at_least, at_most).when(*self._condition)
 
 
+class RuleTemplate:
+
+    def __init__(self, builder, arity=None):
+        if arity is None:
+            arity = len(inspect.signature(builder).parameters)
+        rule = builder(*[Term(ObjectVariable(f"\x00{i}\x00")) for i in range(arity)])
+        if issubclass(type(rule), Atom):
+            rule = Define(rule)
+        if not isinstance(rule, Definition):
+            raise ValueError(f"Expected rule from template builder, got {type(rule)}")
+        chunks = _template_parameters.split(str(rule))
+        self.arity = arity
+        self._format = "%s".join([chunk.replace("%", "%%") for chunk in chunks[::2]])
+        self._order = tuple([int(i) for i in chunks[1::2]])
+        values = [f"('\"%s\"' % row[{i}] if row[{i}].__class__ is str else row[{i}])" for i in self._order]
+        code = compile(f"lambda row: fmt % ({''.join([f'{v}, ' for v in values])})", '<pyspel|rule template|>', "eval")
+        self._format_row = eval(code, {"fmt": self._format})
+
+    def format(self, *params):
+        if len(params) != self.arity:
+            raise ValueError(f"Expected {self.arity} parameters, got {len(params)}")
+        return self._format_row(params)
+
+    def render(self, rows):
+        return "\n".join(map(self._format_row, rows))
+
+    def __str__(self):
+        return self._format % tuple([f"${i}" for i in self._order])
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _rule_body(text):
+    tokens = _rule_tokens.findall(text)
+    depth = 0
+    start = None
+    for (i, token) in enumerate(tokens):
+        if token in ("(", "{", "["):
+            depth += 1
+        elif token in (")", "}", "]"):
+            depth -= 1
+        elif depth == 0 and start is None and token in (":-", ":~"):
+            start = i + 1
+        elif depth == 0 and token == ".":
+            return None if start is None else "".join(tokens[start:i]).strip()
+    return None
+
+
+def _global_variables(body):
+    variables = []
+    element = []
+    (depth, braces) = (0, 0)
+    for token in _rule_tokens.findall(body) + [";"]:
+        if token == "{":
+            braces += 1
+        elif token == "}":
+            braces -= 1
+        elif token in ("(", "["):
+            depth += 1
+        elif token in (")", "]"):
+            depth -= 1
+        elif depth == 0 and braces == 0 and token == ";":
+            if ":" not in element:
+                variables.extend([t for t in element if t[0].isupper() and t not in variables])
+            element = []
+        elif braces == 0:
+            element.append(token)
+    return variables
+
+
+@dataclass(frozen=True)
+class RuleProfile:
+    source: tuple
+    rules: int
+    instances: int
+    rule: str
+
+
+class GroundingProfile:
+
+    def __init__(self, entries, seconds):
+        self.entries = entries
+        self.seconds = seconds
+
+    def __str__(self):
+        total = max(1, sum([entry.instances for entry in self.entries]))
+        lines = [f"Total grounding time: {self.seconds:.3f} s", "", f"{'Source':<40} {'Rules':>8} {'Instances':>12} {'% Inst':>7}  Rule"]
+        for entry in self.entries:
+            source = "<unknown>" if entry.source is None else f"{os.path.basename(entry.source[0])}:{entry.source[1]}"
+            lines.append(f"{source:<40} {entry.rules:>8} {entry.instances:>12} {100 * entry.instances / total:>7.1f}  {entry.rule}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+_profile_head = re.compile(r'_pyspel_prof_(\d+)\b')
+
+
+def _split_constants(rule):
+    tokens = _rule_tokens.findall(rule)
+    parts = []
+    constants = []
+    depth = 0
+    text = ""
+    for i, token in enumerate(tokens):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        first = token[0]
+        if first == '"' or first.isdigit():
+            is_constant = True
+        elif first.islower():
+            following = [t for t in tokens[i + 1:i + 3] if not t.isspace()]
+            is_constant = depth > 0 and (len(following) == 0 or following[0] != "(")
+        else:
+            is_constant = False
+        if is_constant:
+            parts.append(text)
+            constants.append(token)
+            text = ""
+        else:
+            text += token
+    parts.append(text)
+    return tuple(parts), tuple(constants)
+
+
+def _lift_family(name, parts, family):
+    columns = list(zip(*[constants for (index, constants) in family]))
+    variables = {}
+    terms = []
+    for column in columns:
+        if len(set(column)) == 1:
+            terms.append(column[0])
+        else:
+            if column not in variables:
+                variables[column] = f"LIFT_{len(variables)}"
+            terms.append(variables[column])
+    aux = f"{name}({','.join(variables.values())})"
+    parts = list(parts)
+    for i, part in enumerate(parts):
+        if ":-" in part or ":~" in part:
+            neck = ":-" if ":-" in part else ":~"
+            parts[i] = part.replace(neck, f"{neck} {aux};", 1)
+            break
+    else:
+        parts[-1] = f"{parts[-1].rstrip()[:-1]} :- {aux}."
+    rule = parts[0] + "".join([terms[i] + parts[i + 1] for i in range(len(terms))])
+    facts = sorted(set(zip(*variables.keys())))
+    return "\n".join([rule] + [f"{name}({','.join(row)})." for row in facts])
+
+
+def _lift_rules(rules, min_family_size):
+    units = []
+    for rule in rules:
+        if isinstance(rule, str):
+            units.extend([(line, line) for line in rule.split("\n") if line != ""])
+        else:
+            units.append((rule, str(rule)))
+
+    families = {}
+    for index, (rule, text) in enumerate(units):
+        if not (text.endswith(".") or text.endswith("]")):
+            continue
+        parts, constants = _split_constants(text)
+        skeleton = "".join(parts)
+        if len(constants) == 0 or (":-" not in skeleton and ":~" not in skeleton and not skeleton.lstrip().startswith("{")):
+            continue
+        if parts not in families:
+            families[parts] = []
+        families[parts].append((index, constants))
+
+    lifted = {}
+    removed = set()
+    for parts, family in families.items():
+        if len(family) < min_family_size:
+            continue
+        if all(len(set(column)) == 1 for column in zip(*[constants for (index, constants) in family])):
+            continue
+        lifted[family[0][0]] = _lift_family(f"_pyspel_lift{len(lifted)}", parts, family)
+        removed.update([index for (index, constants) in family])
+
+    result = []
+    for index, (rule, text) in enumerate(units):
+        if index in lifted:
+            result.append(lifted[index])
+        elif index not in removed:
+            result.append(rule)
+    return result
+
+
+def _get_variables(text):
+    return {v for v in _variables.findall(text) if v[0] != '"'}
+
+
+class _RuleChecker:
+
+    def __init__(self, rule, arities):
+        self.rule = rule
+        self.arities = arities
+        self.bound = set()
+        self.maybe_bound = set()
+        self.needed = set()
+        self.comparisons = []
+        self.errors = []
+        self.decided = True
+
+    def error(self, message):
+        self.errors.append(message)
+
+    def _valid_value(self, value):
+        while isinstance(value, Term):
+            value = value.value
+        if isinstance(value, ObjectVariable) or isinstance(value, Atom):
+            return True
+        if isinstance(value, Expression):
+            return self._valid_value(value.left) and self._valid_value(value.right)
+        if value.__class__ is int:
+            return True
+        return value.__class__ is str and '"' not in value and "\\" not in value and "\n" not in value
+
+    def _valid_terms(self, atom_):
+        for value in atom_.__dict__.values():
+            if isinstance(value, Atom):
+                if type(value) is not Atom and not isinstance(value, Comparison) and not isinstance(value, Aggregate):
+                    self._valid_terms(value)
+            elif isinstance(value, Term) and not self._valid_value(value):
+                self.decided = False
+
+    def _record_arity(self, atom_):
+        self._valid_terms(atom_)
+        name = atom_.predicate.name
+        arity = len([t for t in atom_.__dict__.values() if isinstance(t, Term) or isinstance(t, Atom)])
+        self.arities.setdefault(name, set()).add(arity)
+
+    def _positive(self, atom_, bound, maybe_bound):
+        self._record_arity(atom_)
+        text = str(atom_)
+        variables = _get_variables(text)
+        variables.discard("_")
+        if _arithmetic.search(text):
+            maybe_bound.update(variables)
+        else:
+            bound.update(variables)
+
+    def _condition(self, condition, bound, maybe_bound, needed, comparisons):
+        if isinstance(condition, tuple):
+            for c in condition:
+                self._condition(c, bound, maybe_bound, needed, comparisons)
+        elif isinstance(condition, Literal):
+            if condition.positive:
+                self._condition(condition.atom, bound, maybe_bound, needed, comparisons)
+            else:
+                self._negative(condition.atom, needed)
+        elif isinstance(condition, Aggregate):
+            self._aggregate(condition, bound, needed)
+        elif type(condition) is Atom or isinstance(condition, Comparison):
+            self._comparison(condition.predicate.name, comparisons)
+        elif isinstance(condition, Atom):
+            self._positive(condition, bound, maybe_bound)
+        else:
+            self.decided = False
+            maybe_bound.update(_get_variables(str(condition)))
+
+    def _negative(self, atom_, needed):
+        if isinstance(atom_, Aggregate):
+            self._aggregate(atom_, set(), needed)
+            return
+        if isinstance(atom_, Atom) and type(atom_) is not Atom and not isinstance(atom_, Comparison):
+            self._record_arity(atom_)
+        variables = _get_variables(str(atom_))
+        variables.discard("_")
+        needed.update(variables)
+
+    def _comparison(self, text, comparisons):
+        if "#" in text:
+            self.decided = False
+            return
+        match = _comparison.match(text)
+        if match is None:
+            self.decided = False
+            return
+        (left, operator, right) = match.groups()
+        if "_" in _get_variables(text):
+            self.error(f"anonymous variable in comparison {text}")
+        comparisons.append((left, operator, right))
+
+    def _aggregate(self, aggregate, bound, needed):
+        if aggregate.operator is not None and aggregate.bound is None:
+            self.error(f"missing bound for aggregate #{aggregate.aggregate_type}")
+            return
+        if aggregate.bound is not None:
+            if isinstance(aggregate.bound, Aggregate):
+                self.error(f"aggregate #{aggregate.aggregate_type} cannot be compared with another aggregate")
+                return
+            bound_variables = _get_variables(str(aggregate.bound))
+            if "_" in bound_variables:
+                self.error(f"anonymous variable in bound of aggregate #{aggregate.aggregate_type}")
+            element_variables = set()
+            if isinstance(aggregate.aggregate_set, dict):
+                for key, condition in aggregate.aggregate_set.items():
+                    element_variables |= _get_variables(str(key)) | _get_variables(str(condition))
+            else:
+                for element in aggregate.aggregate_set:
+                    element_variables |= _get_variables(str(element))
+            if aggregate.operator == "=" and len(bound_variables) == 1 and str(aggregate.bound) in bound_variables \
+                    and not bound_variables & element_variables:
+                bound.update(bound_variables)
+            else:
+                needed.update(bound_variables)
+        if isinstance(aggregate.aggregate_set, dict):
+            for key, condition in aggregate.aggregate_set.items():
+                if isinstance(key, tuple) and len(key) == 0:
+                    self.error(f"empty tuple in aggregate #{aggregate.aggregate_type}")
+                if condition is None:
+                    self.error(f"missing condition in aggregate #{aggregate.aggregate_type}")
+                    continue
+                self._element(key, condition, needed)
+        else:
+            for element in aggregate.aggregate_set:
+                variables = _get_variables(str(element))
+                variables.discard("_")
+                needed.update(variables)
+
+    def _element(self, key, condition, needed):
+        local_bound = set()
+        local_maybe_bound = set()
+        local_needed = set()
+        local_comparisons = []
+        self._condition(condition, local_bound, local_maybe_bound, local_needed, local_comparisons)
+        for (left, operator, right) in local_comparisons:
+            local_needed.update(_get_variables(left) | _get_variables(right))
+            if operator == "=":
+                local_maybe_bound.update(_get_variables(left) | _get_variables(right))
+        for k in key if isinstance(key, tuple) else (key,):
+            if isinstance(k, Atom):
+                if _is_user_atom(k):
+                    self._valid_terms(k)
+            elif not self._valid_value(k):
+                self.decided = False
+        if isinstance(key, tuple):
+            text = ",".join([str(k) for k in key])
+        else:
+            text = str(key)
+        local_needed.update(_get_variables(text))
+        local_needed.discard("_")
+        needed.update(local_needed - local_bound)
+        self.maybe_bound.update(local_maybe_bound)
+
+    def _head(self, head):
+        if isinstance(head, ConditionalLiteral):
+            for elements in head.elements:
+                for key, condition in elements.items():
+                    self._element(key, condition, self.needed)
+        elif isinstance(head, set) or isinstance(head, list):
+            for h in head:
+                self._head(h)
+        elif isinstance(head, Aggregate):
+            self.error(f"aggregate #{head.aggregate_type} is not allowed in the head")
+        elif isinstance(head, Atom):
+            if type(head) is not Atom and not isinstance(head, Comparison):
+                self._record_arity(head)
+            variables = _get_variables(str(head))
+            if "_" in variables:
+                self.error(f"anonymous variable in head atom {head}")
+            self.needed.update(variables)
+        else:
+            self.decided = False
+
+    def _terms(self, *terms):
+        for term in terms:
+            if term is not None and not isinstance(term, str) and not self._valid_value(term):
+                self.decided = False
+            if term is not None:
+                variables = _get_variables(str(term))
+                if "_" in variables:
+                    self.error(f"anonymous variable in term {term}")
+                self.needed.update(variables)
+
+    def check(self):
+        rule = self.rule
+        for element in rule._body:
+            if isinstance(element, ConditionalLiteral):
+                for elements in element.elements:
+                    for key, condition in elements.items():
+                        self._element(key, condition, self.needed)
+            else:
+                self._condition(element, self.bound, self.maybe_bound, self.needed, self.comparisons)
+        if isinstance(rule, Guess):
+            self._head(rule._head)
+            self._terms(rule.exactly, rule.at_least, rule.at_most)
+        elif isinstance(rule, Define):
+            for head in rule._head:
+                self._head(head)
+        elif isinstance(rule, Assert):
+            if rule._soft:
+                self._terms(rule.weight, rule.level, *rule.terms)
+        else:
+            self.decided = False
+
+        changed = True
+        while changed:
+            changed = False
+            for (left, operator, right) in self.comparisons:
+                if operator != "=":
+                    continue
+                for (variable, expression) in [(left, right), (right, left)]:
+                    if variable in _get_variables(variable) and variable not in self.bound and _get_variables(expression) <= self.bound:
+                        self.bound.add(variable)
+                        changed = True
+        for (left, operator, right) in self.comparisons:
+            self.needed.update(_get_variables(left) | _get_variables(right))
+        self.needed.discard("_")
+
+        unsafe = self.needed - self.bound
+        if len(unsafe) != 0:
+            if unsafe <= self.maybe_bound:
+                self.decided = False
+            else:
+                names = {}
+                text = _rename_variables(rule._render(), names)
+                variables = sorted([names.get(v, v) for v in unsafe - self.maybe_bound])
+                self.error(f"unsafe variables in rule {text.strip()}: {', '.join(variables)}")
+        if len(self.errors) != 0:
+            self.decided = True
+        return self.decided
+
+
+def _check_rules(rules):
+    arities = {}
+    errors = []
+    decided = True
+    for rule in rules:
+        if not isinstance(rule, Definition):
+            decided = False
+            continue
+        checker = _RuleChecker(rule, arities)
+        try:
+            decided = checker.check() and decided
+        except ValueError as e:
+            checker.error(str(e))
+        errors.extend(checker.errors)
+    warnings = [f"predicate {name} is used with different arities: {', '.join([str(a) for a in sorted(arity)])}" for name, arity in arities.items() if len(arity) > 1]
+    return decided, errors, warnings
+
+
+class _Unsupported(Exception):
+    pass
+
+
+_unbound = object()
+_negated_comparison = {"=": "!=", "!=": "=", "<": ">=", "<=": ">", ">": "<=", ">=": "<"}
+
+
+def _is_user_atom(atom_):
+    return isinstance(atom_, Atom) and type(atom_) is not Atom and not isinstance(atom_, Aggregate) and not isinstance(atom_, Comparison)
+
+
+def _value_pattern(value, variables):
+    if isinstance(value, Term):
+        return _value_pattern(value.value, variables)
+    if isinstance(value, ObjectVariable):
+        if value.value == "_":
+            return ("_",)
+        if not _variable_name.match(value.value):
+            raise _Unsupported()
+        variables.add(value.value)
+        return ("v", value.value)
+    if value.__class__ is int or value.__class__ is str:
+        return ("c", value)
+    if isinstance(value, Expression):
+        return ("e", value.operator, _value_pattern(value.left, variables), _value_pattern(value.right, variables))
+    raise _Unsupported()
+
+
+def _atom_pattern(atom_, variables):
+    args = []
+    for value in atom_.__dict__.values():
+        if isinstance(value, Term):
+            args.append(_value_pattern(value, variables))
+        elif isinstance(value, Atom):
+            if not _is_user_atom(value):
+                raise _Unsupported()
+            args.append(("a",) + _atom_pattern(value, variables))
+    return atom_.predicate.name, tuple(args)
+
+
+def _pattern_kinds(pattern):
+    if pattern[0] == "a":
+        return set().union({"a"}, *[_pattern_kinds(p) for p in pattern[2]])
+    if pattern[0] == "e":
+        return {"e"} | _pattern_kinds(pattern[2]) | _pattern_kinds(pattern[3])
+    return {pattern[0]}
+
+
+def _ground(pattern, binding):
+    kind = pattern[0]
+    if kind == "c":
+        return pattern[1]
+    if kind == "v":
+        return binding[pattern[1]]
+    if kind == "a":
+        args = tuple([_ground(p, binding) for p in pattern[2]])
+        if None in args:
+            return None
+        return (pattern[1],) + args
+    if kind == "e":
+        left = _ground(pattern[2], binding)
+        right = _ground(pattern[3], binding)
+        if left.__class__ is not int or right.__class__ is not int:
+            return None
+        return _fold_integers(left, pattern[1], right)
+    raise _Unsupported()
+
+
+def _match(pattern, value, binding):
+    kind = pattern[0]
+    if kind == "v":
+        bound = binding.get(pattern[1], _unbound)
+        if bound is _unbound:
+            binding = dict(binding)
+            binding[pattern[1]] = value
+            return binding
+        return binding if bound == value else None
+    if kind == "c":
+        return binding if value == pattern[1] else None
+    if kind == "_":
+        return binding
+    if value.__class__ is not tuple or len(value) != len(pattern[2]) + 1 or value[0] != pattern[1]:
+        return None
+    for (p, v) in zip(pattern[2], value[1:]):
+        binding = _match(p, v, binding)
+        if binding is None:
+            return None
+    return binding
+
+
+def _symbol_key(value):
+    if value.__class__ is int:
+        return 0, value
+    if value.__class__ is str:
+        return 2, value
+    if len(value) == 1:
+        return 1, value[0]
+    return 3, len(value) - 1, value[0], tuple([_symbol_key(v) for v in value[1:]])
+
+
+def _compare(left, operator, right):
+    if left is None or right is None:
+        return False
+    if operator == "=":
+        return left == right
+    if operator == "!=":
+        return left != right
+    if left.__class__ is not right.__class__ or left.__class__ is tuple:
+        (left, right) = (_symbol_key(left), _symbol_key(right))
+    if operator == "<":
+        return left < right
+    if operator == "<=":
+        return left <= right
+    if operator == ">":
+        return left > right
+    return left >= right
+
+
+class _Relation:
+
+    def __init__(self):
+        self.facts = set()
+        self.indexes = {}
+
+    def add(self, fact):
+        if fact in self.facts:
+            return False
+        self.facts.add(fact)
+        for (positions, index) in self.indexes.items():
+            index.setdefault(tuple([fact[p] for p in positions]), []).append(fact)
+        return True
+
+    def lookup(self, positions, key):
+        if len(positions) == 0:
+            return self.facts
+        index = self.indexes.get(positions)
+        if index is None:
+            index = {}
+            for fact in self.facts:
+                index.setdefault(tuple([fact[p] for p in positions]), []).append(fact)
+            self.indexes[positions] = index
+        return index.get(key, ())
+
+
+class _DatalogRule:
+
+    def __init__(self, rule):
+        if not isinstance(rule, Define) or len(rule._head) != 1 or not _is_user_atom(rule._head[0]):
+            raise _Unsupported()
+        variables = set()
+        self.head = _atom_pattern(rule._head[0], variables)
+        if "_" in set().union(*[_pattern_kinds(p) for p in self.head[1]]):
+            raise _Unsupported()
+        self.positive = []
+        self.negative = []
+        self.comparisons = []
+        for element in rule._body:
+            positive = True
+            if isinstance(element, Literal):
+                if not element.positive:
+                    if str(element).startswith("not not "):
+                        raise _Unsupported()
+                    positive = False
+                element = element.atom
+            variables = set()
+            if isinstance(element, Comparison):
+                (left, operator, right) = element.operands
+                if left.__class__ is str or right.__class__ is str:
+                    raise _Unsupported()
+                left = _value_pattern(left, variables)
+                right = _value_pattern(right, variables)
+                if "_" in _pattern_kinds(left) | _pattern_kinds(right):
+                    raise _Unsupported()
+                self.comparisons.append((left, operator if positive else _negated_comparison[operator], right, frozenset(variables)))
+            elif _is_user_atom(element):
+                (name, args) = _atom_pattern(element, variables)
+                if "e" in set().union(set(), *[_pattern_kinds(p) for p in args]):
+                    raise _Unsupported()
+                (self.positive if positive else self.negative).append((name, args, frozenset(variables)))
+            else:
+                raise _Unsupported()
+        self.dependencies = {name for (name, args, variables) in self.positive}
+        self.negative_dependencies = {name for (name, args, variables) in self.negative}
+        self._plans = {}
+        self.plan(None)
+
+    def plan(self, first):
+        if first in self._plans:
+            return self._plans[first]
+        bound = set()
+        steps = []
+        remaining = list(range(len(self.positive)))
+        comparisons = list(self.comparisons)
+        negatives = list(self.negative)
+
+        def drain():
+            changed = True
+            while changed:
+                changed = False
+                for comparison in list(comparisons):
+                    (left, operator, right, variables) = comparison
+                    if variables <= bound:
+                        steps.append(("filter", comparison))
+                    elif operator == "=" and left[0] == "v" and left[1] not in bound and variables - {left[1]} <= bound:
+                        steps.append(("assign", left[1], right))
+                        bound.add(left[1])
+                    elif operator == "=" and right[0] == "v" and right[1] not in bound and variables - {right[1]} <= bound:
+                        steps.append(("assign", right[1], left))
+                        bound.add(right[1])
+                    else:
+                        continue
+                    comparisons.remove(comparison)
+                    changed = True
+                for negative in list(negatives):
+                    if negative[2] <= bound:
+                        positions = tuple([i for (i, a) in enumerate(negative[1]) if a[0] == "c" or a[0] == "v"])
+                        steps.append(("negative", negative[0], negative[1], positions))
+                        negatives.remove(negative)
+
+        drain()
+        while len(remaining) != 0:
+            if first is not None and first in remaining:
+                index = first
+            else:
+                index = max(remaining, key=lambda i: len([a for a in self.positive[i][1] if a[0] == "c" or (a[0] == "v" and a[1] in bound)]))
+            remaining.remove(index)
+            (name, args, variables) = self.positive[index]
+            positions = tuple([i for (i, a) in enumerate(args) if a[0] == "c" or (a[0] == "v" and a[1] in bound)])
+            steps.append(("atom", index, name, args, positions))
+            bound.update(variables)
+            drain()
+        head_variables = set()
+        for pattern in self.head[1]:
+            _value_pattern_variables(pattern, head_variables)
+        if len(comparisons) != 0 or len(negatives) != 0 or not head_variables <= bound:
+            raise _Unsupported()
+        self._plans[first] = steps
+        return steps
+
+    def evaluate(self, relations, delta_index, delta, emit):
+        steps = self.plan(delta_index)
+        (name, head) = self.head
+
+        def run(k, binding):
+            if k == len(steps):
+                fact = tuple([_ground(p, binding) for p in head])
+                if None not in fact:
+                    emit(name, fact)
+                return
+            step = steps[k]
+            if step[0] == "atom":
+                (_, index, atom_name, args, positions) = step
+                if index == delta_index:
+                    candidates = delta
+                else:
+                    relation = relations.get(atom_name)
+                    if relation is None:
+                        return
+                    candidates = relation.lookup(positions, tuple([_ground(args[p], binding) for p in positions]))
+                for fact in candidates:
+                    if len(fact) != len(args):
+                        continue
+                    extended = binding
+                    for (p, v) in zip(args, fact):
+                        extended = _match(p, v, extended)
+                        if extended is None:
+                            break
+                    if extended is not None:
+                        run(k + 1, extended)
+            elif step[0] == "filter":
+                (left, operator, right, variables) = step[1]
+                if _compare(_ground(left, binding), operator, _ground(right, binding)):
+                    run(k + 1, binding)
+            elif step[0] == "assign":
+                value = _ground(step[2], binding)
+                if value is not None:
+                    extended = dict(binding)
+                    extended[step[1]] = value
+                    run(k + 1, extended)
+            else:
+                (_, atom_name, args, positions) = step
+                relation = relations.get(atom_name)
+                if relation is not None:
+                    for fact in relation.lookup(positions, tuple([_ground(args[p], binding) for p in positions])):
+                        if len(fact) != len(args):
+                            continue
+                        extended = binding
+                        for (p, v) in zip(args, fact):
+                            extended = _match(p, v, extended)
+                            if extended is None:
+                                break
+                        if extended is not None:
+                            return
+                run(k + 1, binding)
+
+        run(0, {})
+
+
+def _value_pattern_variables(pattern, variables):
+    if pattern[0] == "v":
+        variables.add(pattern[1])
+    elif pattern[0] == "a":
+        for p in pattern[2]:
+            _value_pattern_variables(p, variables)
+    elif pattern[0] == "e":
+        _value_pattern_variables(pattern[2], variables)
+        _value_pattern_variables(pattern[3], variables)
+
+
+def _head_names(element, names):
+    if isinstance(element, Literal):
+        _head_names(element.atom, names)
+    elif isinstance(element, ConditionalLiteral):
+        for elements in element.elements:
+            _head_names(elements, names)
+    elif isinstance(element, dict):
+        for key in element:
+            _head_names(key, names)
+    elif isinstance(element, set) or isinstance(element, list) or isinstance(element, tuple):
+        for e in element:
+            _head_names(e, names)
+    elif _is_user_atom(element):
+        names.add(element.predicate.name)
+
+
+def _identifiers(text):
+    return {token for token in _rule_tokens.findall(text) if token[0].islower()}
+
+
+def _render_symbol(value):
+    if value.__class__ is str:
+        table = _interning.get(None)
+        if table is not None:
+            return table.symbol(value)
+        return f'"{value}"'
+    if value.__class__ is tuple:
+        if len(value) == 1:
+            return value[0]
+        return "%s(%s)" % (value[0], ", ".join([_render_symbol(v) for v in value[1:]]))
+    return str(value)
+
+
+def _strata(names, rules):
+    edges = {name: set() for name in names}
+    for rule in rules:
+        edges[rule.head[0]].update((rule.dependencies | rule.negative_dependencies) & names)
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    def connect(name):
+        index[name] = low[name] = len(index)
+        stack.append(name)
+        on_stack.add(name)
+        for other in edges[name]:
+            if other not in index:
+                connect(other)
+                low[name] = min(low[name], low[other])
+            elif other in on_stack:
+                low[name] = min(low[name], index[other])
+        if low[name] == index[name]:
+            component = set()
+            while True:
+                other = stack.pop()
+                on_stack.discard(other)
+                component.add(other)
+                if other == name:
+                    break
+            components.append(component)
+
+    for name in sorted(names):
+        if name not in index:
+            connect(name)
+    return components
+
+
+def _evaluate_definite(rules, encoding, cache):
+    blocked = set()
+    if encoding is not None:
+        blocked |= _identifiers(encoding.program)
+    relations = {}
+    facts = []
+    candidates = []
+    for (i, rule) in enumerate(rules):
+        if isinstance(rule, str):
+            blocked |= _identifiers(rule)
+            continue
+        if isinstance(rule, Define) and len(rule._body) == 0 and len(rule._head) == 1 and _is_user_atom(rule._head[0]):
+            try:
+                (name, args) = _atom_pattern(rule._head[0], set())
+                if _pattern_kinds(("a", name, args)) <= {"a", "c"}:
+                    relations.setdefault(name, _Relation()).add(tuple([_ground(p, {}) for p in args]))
+                    facts.append(i)
+                    continue
+            except _Unsupported:
+                pass
+        try:
+            candidates.append((i, _DatalogRule(rule)))
+        except _Unsupported:
+            if isinstance(rule, Define):
+                _head_names(rule._head, blocked)
+            elif isinstance(rule, Guess):
+                _head_names(rule._head, blocked)
+
+    heads = {}
+    for (i, rule) in candidates:
+        heads.setdefault(rule.head[0], []).append((i, rule))
+    evaluable = set(heads) - blocked
+    while True:
+        changed = True
+        while changed:
+            changed = False
+            for name in list(evaluable):
+                for (i, rule) in heads[name]:
+                    if any(d in blocked or (d in heads and d not in evaluable) for d in rule.dependencies | rule.negative_dependencies):
+                        evaluable.discard(name)
+                        changed = True
+                        break
+        components = _strata(evaluable, [rule for name in evaluable for (i, rule) in heads[name]])
+        unstratified = set()
+        for component in components:
+            if any(rule.negative_dependencies & component for name in component for (i, rule) in heads[name]):
+                unstratified |= component
+        if len(unstratified) == 0:
+            break
+        evaluable -= unstratified
+
+    evaluated = {i for name in evaluable for (i, rule) in heads[name]}
+    if len(evaluated) == 0:
+        return list(rules), ""
+    key = None
+    if cache is not None:
+        needed = set(evaluable)
+        for name in evaluable:
+            for (i, rule) in heads[name]:
+                needed |= rule.dependencies | rule.negative_dependencies
+        texts = [str(rules[i]) for i in sorted(evaluated)]
+        texts += [str(rules[i]) for i in facts if rules[i]._head[0].predicate.name in needed]
+        key = hashlib.sha256("\n".join(texts).encode()).hexdigest()
+        if key in cache:
+            return [rule for (i, rule) in enumerate(rules) if i not in evaluated], cache[key]
+
+    derived = []
+    try:
+        for component in components:
+            stratum = [rule for name in component for (i, rule) in heads[name]]
+            pending = []
+            for rule in stratum:
+                rule.evaluate(relations, None, None, lambda name, fact: pending.append((name, fact)))
+            while len(pending) != 0:
+                delta = {}
+                for (name, fact) in pending:
+                    if relations.setdefault(name, _Relation()).add(fact):
+                        delta.setdefault(name, []).append(fact)
+                        derived.append((name, fact))
+                pending = []
+                for rule in stratum:
+                    for (index, (name, args, variables)) in enumerate(rule.positive):
+                        if name in component and name in delta:
+                            rule.evaluate(relations, index, delta[name], lambda name, fact: pending.append((name, fact)))
+    except _Unsupported:
+        return list(rules), ""
+    text = "".join(sorted([f"{_render_symbol((name,) + fact)}.\n" for (name, fact) in derived]))
+    if key is not None:
+        cache[key] = text
+    return [rule for (i, rule) in enumerate(rules) if i not in evaluated], text
+
+
+@dataclass(frozen=True)
+class SymmetryReport:
+    guess: str
+    domain: str
+    values: tuple
+    items: int
+    rules: str
+
+
+def _rule_parts(element, atoms, others):
+    if isinstance(element, Literal):
+        _rule_parts(element.atom, atoms, others)
+    elif isinstance(element, ConditionalLiteral):
+        for elements in element.elements:
+            _rule_parts(elements, atoms, others)
+    elif isinstance(element, dict):
+        for (key, value) in element.items():
+            _rule_parts(key, atoms, others)
+            _rule_parts(value, atoms, others)
+    elif isinstance(element, set) or isinstance(element, list) or isinstance(element, tuple):
+        for e in element:
+            _rule_parts(e, atoms, others)
+    elif isinstance(element, Aggregate):
+        others.append(element)
+        if not isinstance(element.aggregate_set, str):
+            _rule_parts(element.aggregate_set, atoms, others)
+    elif isinstance(element, Comparison):
+        others.append(element)
+    elif _is_user_atom(element):
+        atoms.append(element)
+
+
+def _atom_arguments(atom_):
+    return [value for value in atom_.__dict__.values() if isinstance(value, Term) or isinstance(value, Atom)]
+
+
+def _leaves(value, leaves):
+    if value.__class__ is tuple:
+        for v in value[1:]:
+            _leaves(v, leaves)
+    else:
+        leaves.add(value)
+
+
+def _value_invariant(definitions, text_names, domain, head, index):
+    positions = {domain: None, head: {index}}
+    parts = []
+    for rule in definitions:
+        (atoms, heads, others) = ([], [], [])
+        _rule_parts(rule._body, atoms, others)
+        if isinstance(rule, Define) or isinstance(rule, Guess):
+            _rule_parts(rule._head, heads, others)
+        parts.append((rule, atoms + heads, heads, others))
+
+    def value_variables(atoms):
+        variables = set()
+        for atom_ in atoms:
+            name = atom_.predicate.name
+            if name in positions:
+                for (i, arg) in enumerate(_atom_arguments(atom_)):
+                    if positions[name] is None or i in positions[name]:
+                        variables |= _get_variables(str(arg))
+        variables.discard("_")
+        return variables
+
+    changed = True
+    while changed:
+        changed = False
+        for (rule, atoms, heads, others) in parts:
+            variables = value_variables(atoms)
+            for atom_ in heads:
+                for (i, arg) in enumerate(_atom_arguments(atom_)):
+                    name = atom_.predicate.name
+                    if _get_variables(str(arg)) & variables and (name not in positions or (positions[name] is not None and i not in positions[name])):
+                        positions[name] = positions.get(name, set()) | {i}
+                        changed = True
+    if len(set(positions) & text_names) != 0:
+        return False
+    for (rule, atoms, heads, others) in parts:
+        variables = value_variables(atoms)
+        if len(variables) == 0:
+            continue
+        for atom_ in atoms:
+            for arg in _atom_arguments(atom_):
+                text = str(arg)
+                if _arithmetic.search(text) and _get_variables(text) & variables:
+                    return False
+        for other in others:
+            text = str(other)
+            if not _get_variables(text) & variables:
+                continue
+            if isinstance(other, Aggregate) and other.aggregate_type != "count":
+                return False
+            if isinstance(other, Comparison) and (other.operands[1] not in ("=", "!=") or _arithmetic.search(text)):
+                return False
+        if isinstance(rule, Assert) and rule._soft and _get_variables(str(rule.weight)) & variables:
+            return False
+    return True
+
+
+def _break_symmetries(rules, encoding, exclude, numeric):
+    texts = [rule for rule in rules if isinstance(rule, str)]
+    if encoding is not None:
+        texts.append(encoding.program)
+    text_names = set().union(set(), *[_identifiers(text) for text in texts])
+    constants = set()
+    for text in texts:
+        constants.update([token for token in _rule_tokens.findall(text) if token[0] == '"' or token[0].isdigit()])
+    facts = {}
+    defined = set()
+    definitions = []
+    for rule in rules:
+        if isinstance(rule, str):
+            continue
+        if isinstance(rule, Define) and len(rule._body) == 0 and len(rule._head) == 1 and _is_user_atom(rule._head[0]):
+            try:
+                (name, args) = _atom_pattern(rule._head[0], set())
+                if _pattern_kinds(("a", name, args)) <= {"a", "c"}:
+                    facts.setdefault(name, []).append(tuple([_ground(p, {}) for p in args]))
+                    continue
+            except _Unsupported:
+                pass
+        definitions.append(rule)
+        if isinstance(rule, Define) or isinstance(rule, Guess):
+            _head_names(rule._head, defined)
+        constants.update([token for token in _rule_tokens.findall(str(rule)) if token[0] == '"' or token[0].isdigit()])
+
+    def fact_predicate(name):
+        return name in facts and name not in defined and name not in text_names
+
+    report = []
+    added = []
+    broken = set()
+    for rule in definitions:
+        if not isinstance(rule, Guess) or rule.exactly.__class__ is not int or rule.exactly != 1 or len(rule._body) != 1:
+            continue
+        if not isinstance(rule._head, ConditionalLiteral) or len(rule._head.elements) != 1 or len(rule._head.elements[0]) != 1:
+            continue
+        ((atom_, condition),) = rule._head.elements[0].items()
+        body = rule._body[0]
+        if not _is_user_atom(atom_) or not _is_user_atom(condition) or not _is_user_atom(body):
+            continue
+        domain = condition.predicate.name
+        if domain in exclude or domain in broken or not fact_predicate(domain) or not fact_predicate(body.predicate.name):
+            continue
+        try:
+            (condition_variables, body_variables, head_variables) = (set(), set(), set())
+            condition_pattern = _atom_pattern(condition, condition_variables)
+            body_pattern = _atom_pattern(body, body_variables)
+            (head, head_pattern) = _atom_pattern(atom_, head_variables)
+        except _Unsupported:
+            continue
+        arguments = []
+        for pattern in head_pattern:
+            variables = set()
+            _value_pattern_variables(pattern, variables)
+            arguments.append((pattern, variables, _pattern_kinds(pattern)))
+        value_indexes = [i for (i, (pattern, variables, kinds)) in enumerate(arguments) if variables & condition_variables]
+        if len(value_indexes) != 1 or any(not kinds <= {"a", "c", "v"} for (pattern, variables, kinds) in arguments):
+            continue
+        index = value_indexes[0]
+        if arguments[index][1] != condition_variables or any(not variables <= body_variables or variables & condition_variables
+                                                             for (i, (pattern, variables, kinds)) in enumerate(arguments) if i != index):
+            continue
+        if len(_get_variables(str(condition)) - condition_variables) != 0:
+            continue
+
+        leaves = set()
+        values = set()
+        for fact in facts[domain]:
+            binding = _match(("a",) + condition_pattern, (domain,) + fact, {})
+            if binding is not None:
+                values.add(_ground(arguments[index][0], binding))
+                _leaves((domain,) + fact, leaves)
+        items = set()
+        for fact in facts[body.predicate.name]:
+            binding = _match(("a",) + body_pattern, (body.predicate.name,) + fact, {})
+            if binding is not None:
+                items.add(tuple([_ground(pattern, binding) for (i, (pattern, variables, kinds)) in enumerate(arguments) if i != index]))
+        if len(values) < 2 or len(items) < 2:
+            continue
+        if (not numeric and any(leaf.__class__ is int for leaf in leaves)) or any(_render_symbol(leaf) in constants for leaf in leaves):
+            continue
+        if any(leaves & _fact_leaves(rows) for (name, rows) in facts.items() if name != domain):
+            continue
+        if not _value_invariant(definitions, text_names, domain, head, index):
+            continue
+
+        broken.add(domain)
+        prefix = f"_pyspel_sym{len(report)}"
+        values = sorted(values, key=_render_symbol)
+        items = sorted(items, key=lambda item: [_render_symbol(v) for v in item])
+
+        def render_item(item):
+            if len(item) == 1:
+                return _render_symbol(item[0])
+            return "(%s)" % ", ".join([_render_symbol(v) for v in item])
+
+        head_arguments = [str(arg) for arg in _atom_arguments(atom_)]
+        item_term = head_arguments[:index] + head_arguments[index + 1:]
+        item_term = item_term[0] if len(item_term) == 1 else "(%s)" % ", ".join(item_term)
+        lines = [f"{prefix}_rank({_render_symbol(v)}, {r + 1})." for (r, v) in enumerate(values)]
+        lines.append(f"{prefix}_first({render_item(items[0])}).")
+        lines += [f"{prefix}_next({render_item(items[i])}, {render_item(items[i + 1])})." for i in range(len(items) - 1)]
+        lines += [_rename_variables(f"{prefix}_used({item_term}, R) :- {atom_}; {prefix}_rank({head_arguments[index]}, R)."),
+                  f"{prefix}_seen(X, R) :- {prefix}_used(X, R).",
+                  f"{prefix}_seen(Y, R) :- {prefix}_seen(X, R); {prefix}_next(X, Y).",
+                  f":- {prefix}_used(Y, R); R > 1; {prefix}_next(X, Y); not {prefix}_seen(X, R - 1).",
+                  f":- {prefix}_used(X, R); R > 1; {prefix}_first(X)."]
+        text = "\n".join(lines)
+        added.append(text)
+        report.append(SymmetryReport(str(rule), domain, tuple(values), len(items), text))
+    return added, report
+
+
+def _fact_leaves(rows):
+    leaves = set()
+    for row in rows:
+        for value in row:
+            _leaves(value, leaves)
+    return leaves
+
+
 def _print_warning(stderr):
     print("ASP warning message:", file=sys.stderr)
     for line in stderr.splitlines():
         print(line, file=sys.stderr)
 
 
+class Encoding:
+
+    def __init__(self, program, in_memory=False):
+        if isinstance(program, Problem):
+            program = str(program)
+        if not isinstance(program, str):
+            raise ValueError(f"Expected Problem or str as program, got {type(program)}")
+        self.program = program
+        self.in_memory = in_memory
+        self._filename = None
+        self._digest = None
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.program.encode()).hexdigest()
+        return self._digest
+
+    @property
+    def filename(self):
+        if self._filename is None:
+            filename = _tmp_filename(".lp")
+            with open(filename, "w") as f:
+                f.write(self.program)
+            self._filename = filename
+        return self._filename
+
+    def close(self):
+        if self._filename is not None:
+            if os.path.exists(self._filename):
+                os.remove(self._filename)
+            self._filename = None
+
+    def __del__(self):
+        self.close()
+
+    def __reduce__(self):
+        return Encoding, (self.program, self.in_memory)
+
+    def __str__(self):
+        return self.program
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class _Spool:
+
+    def __init__(self, filename, compress):
+        self._owned = filename is True
+        if self._owned:
+            filename = _tmp_filename(".lp.gz" if compress else ".lp")
+        self.filename = filename
+        self.compress = compress
+        self._file = None
+        self._open("w")
+
+    def _open(self, mode):
+        if self.compress:
+            self._file = gzip.open(self.filename, mode + "t")
+        else:
+            self._file = open(self.filename, mode)
+
+    def write(self, rule):
+        if self._file is None:
+            self._open("a")
+        self._file.write(rule)
+        self._file.write("\n")
+
+    def flush(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def chunks(self, size=1 << 20):
+        self.flush()
+        with (gzip.open(self.filename, "rb") if self.compress else open(self.filename, "rb")) as f:
+            chunk = f.read(size)
+            while len(chunk) != 0:
+                yield chunk
+                chunk = f.read(size)
+
+    def read(self):
+        return b"".join(self.chunks()).decode()
+
+    def close(self):
+        self.flush()
+        if self._owned and os.path.exists(self.filename):
+            os.remove(self.filename)
+            self._owned = False
+
+    def __del__(self):
+        self.close()
+
+
 class Problem:
     ASP_CORE = 0
     GRINGO = 1
 
-    def __init__(self):
+    def __init__(self, encoding=None, spool=None, compress=False, intern=False):
+        if encoding is not None and not isinstance(encoding, Encoding):
+            raise ValueError(f"Expected Encoding, got {type(encoding)}")
+        if intern and encoding is not None:
+            _check_interned_text(encoding.program)
         self.rules = []
+        self.encoding = encoding
+        self.intern = intern
+        self._constants = _ConstantTable() if intern else None
+        self._version = 0
+        self._ground_cache = None
+        self._spool = None
+        if spool is not None:
+            if spool is not True and not isinstance(spool, str):
+                raise ValueError(f"Expected True or a filename for spool, got {type(spool)}")
+            self._spool = _Spool(spool, compress)
 
     def add(self, *definitions):
         for i in definitions:
@@ -622,20 +2848,199 @@ class Problem:
             definition = Define(definition)
         if not isinstance(definition, Definition) and not isinstance(definition, str):
             raise ValueError("Expected rule, got %s" % type(definition))
-        self.rules.append(definition)
+        if self.intern and isinstance(definition, str):
+            _check_interned_text(definition)
+        self._version += 1
+        if self._spool is not None:
+            with _Interning(self._constants):
+                text = str(definition)
+            if text != "":
+                self._spool.write(text)
+        else:
+            self.rules.append(definition)
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+
+    def _derive(self, encoding):
+        problem = Problem(encoding=encoding, intern=self.intern)
+        problem._constants = self._constants
+        return problem
+
+    def lift(self, min_family_size=2):
+        problem = self._derive(self.encoding)
+        with _Interning(self._constants):
+            if self._spool is not None:
+                problem.rules = _lift_rules([self._spool.read()], min_family_size)
+            else:
+                problem.rules = _lift_rules(self.rules, min_family_size)
+        return problem
+
+    def evaluate(self, cache=None):
+        if self._spool is not None:
+            raise ValueError("Cannot evaluate a spooled problem")
+        with _Interning(self._constants):
+            (rules, facts) = _evaluate_definite(self.rules, self.encoding, cache)
+        problem = self._derive(self.encoding)
+        problem.rules = rules
+        if facts != "":
+            problem.rules.append(facts)
+        return problem
+
+    def break_symmetries(self, exclude=None, numeric=False):
+        if self._spool is not None:
+            raise ValueError("Cannot analyze a spooled problem")
+        names = set()
+        for element in [] if exclude is None else exclude:
+            names.add(element.predicate.name if isinstance(element, Atom) else element)
+        with _Interning(self._constants):
+            (rules, report) = _break_symmetries(self.rules, self.encoding, names, numeric)
+        problem = self._derive(self.encoding)
+        problem.rules = self.rules + rules
+        return problem, report
+
+    def profile_grounding(self, solver_path=None, options=None):
+        if self._spool is not None:
+            raise ValueError("Cannot profile a spooled problem")
+        sources = {}
+        groups = []
+        owners = []
+        aux = []
+        for rule in self.rules:
+            if not isinstance(rule, Definition):
+                continue
+            text = str(rule)
+            if text == "":
+                continue
+            key = rule.source if rule.source is not None else text
+            if key not in sources:
+                sources[key] = len(groups)
+                groups.append([rule.source, 0, 0, text])
+            group = groups[sources[key]]
+            group[1] += 1
+            if self.intern:
+                with _Interning(self._constants):
+                    text = str(rule)
+            body = _rule_body(text)
+            if body is None:
+                group[2] += 1
+                continue
+            variables = _global_variables(body)
+            head = f"_pyspel_prof_{len(owners)}" + (f"({','.join(variables)})" if len(variables) != 0 else "")
+            owners.append(sources[key])
+            aux.append(f"{head} :- {body}.\n")
+        start = monotonic()
+        (stdout, stderr, exit_code, killed) = _run_program(_ExtendedProgram(self, "".join(aux)), solver_path,
+                                                           ([] if options is None else options) + ["--text"], timeout=None)
+        seconds = monotonic() - start
+        if exit_code in invalid_exit_codes:
+            raise ValueError(f"ASP Error: {stderr}")
+        for line in stdout.splitlines():
+            match = _profile_head.match(line)
+            if match is not None:
+                groups[owners[int(match.group(1))]][2] += 1
+        entries = [RuleProfile(*group) for group in groups]
+        entries.sort(key=lambda entry: entry.instances, reverse=True)
+        return GroundingProfile(entries, seconds)
+
+    def freeze(self, in_memory=False):
+        if self.encoding is None:
+            return Encoding(self._render_rules(), in_memory=in_memory)
+        return Encoding(self.encoding.program + self._render_rules(), in_memory=in_memory)
 
     def check(self, solver_path=None):
-        (stdout, stderr, exit_code, killed) = _run_solver(rules=str(self), solver_path=solver_path, options=["--text"], timeout=None)
+        (decided, errors, warnings) = _check_rules(self.rules)
+        if len(errors) != 0:
+            raise ValueError("ASP Error: %s" % "\n".join(errors))
+        if len(warnings) != 0:
+            _print_warning("\n".join(warnings))
+        if decided and self.encoding is None and self._spool is None:
+            return
+        (stdout, stderr, exit_code, killed) = self._run(solver_path=solver_path, options=["--text"], timeout=None)
         if exit_code in invalid_exit_codes:
             raise ValueError(f"ASP Error: {stderr}")
         elif len(stderr) != 0:
             _print_warning(stderr)
 
+    def _inputs(self):
+        files = []
+        stdin = []
+        if self.encoding is not None:
+            if self.encoding.in_memory:
+                stdin.append(self.encoding.program.encode())
+            else:
+                files.append(self.encoding.filename)
+        if self._spool is None:
+            rules = self._render_rules()
+        else:
+            rules = ""
+            if self._spool.compress:
+                stdin = itertools.chain(stdin, self._spool.chunks())
+            else:
+                self._spool.flush()
+                files.append(self._spool.filename)
+        return rules, files, stdin if stdin != [] else None
+
+    def _run(self, solver_path, options, timeout):
+        return _run_program(self, solver_path, options, timeout=timeout)
+
+    def to_bytes(self, compress=True):
+        if self.intern:
+            raise ValueError("Cannot serialize a problem with interned constants")
+        rules = []
+        if self._spool is not None:
+            rules.append(self._spool.read())
+        else:
+            for rule in self.rules:
+                fact = None
+                if isinstance(rule, Define) and len(rule._body) == 0 and len(rule._head) == 1:
+                    fact = _atom_data(rule._head[0], ground=True)
+                rules.append(str(rule) if fact is None else fact)
+        encoding = None
+        if self.encoding is not None:
+            encoding = (self.encoding.program, self.encoding.in_memory)
+        return _wire_dumps(ord("P"), (encoding, rules), compress)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (encoding, rules) = _wire_loads(ord("P"), data)
+        problem = Problem(encoding=None if encoding is None else Encoding(*encoding))
+        facts = []
+        for rule in rules:
+            if isinstance(rule, dict):
+                if _atom_class(rule) is None:
+                    facts.append(_render_atom_data(rule) + ".")
+                    continue
+                rule = Define(_load_atom(rule))
+            elif not isinstance(rule, str):
+                raise ValueError(f"Unexpected serialized rule of type {type(rule)}")
+            if len(facts) != 0:
+                problem.rules.append("\n".join(facts))
+                facts = []
+            problem.rules.append(rule)
+        if len(facts) != 0:
+            problem.rules.append("\n".join(facts))
+        return problem
+
+    def __reduce__(self):
+        return _load_problem, (self.to_bytes(compress=False),)
+
+    def _render_rules(self):
+        if self._spool is not None:
+            return self._spool.read()
+        with _Interning(self._constants):
+            return "".join(["%s\n" % text for text in map(str, self.rules) if text != ""])
+
     def __str__(self):
-        res = ""
-        for i in self.rules:
-            res += "%s\n" % (str(i))
-        return res
+        if self.encoding is None:
+            return self._render_rules()
+        return self.encoding.program + self._render_rules()
+
+    def render(self, dialect=GRINGO):
+        if dialect != Problem.GRINGO and dialect != Problem.ASP_CORE:
+            raise ValueError(f"Unexpected dialect {dialect}")
+        return str(_DialectProgram(self, dialect))
 
     def __repr__(self):
         return self.__str__()
@@ -651,49 +3056,81 @@ class Problem:
     def possible_instances(self, atom_name, solver_path=None):
         if not isinstance(atom_name, Atom):
             raise ValueError(f"Expected atom, got {type(atom_name)}")
-        (stdout, stderr, exit_code, killed) = _run_solver(rules=str(self), solver_path=solver_path, options=["--output=smodels"], timeout=None)
+        return self.possible_instances_many([atom_name], solver_path=solver_path)[atom_name.predicate.name]
+
+    def possible_instances_many(self, atoms, solver_path=None):
+        if not isinstance(atoms, list) and not isinstance(atoms, tuple):
+            raise ValueError(f"Expected list of atoms, got {type(atoms)}")
+        for atom_ in atoms:
+            if not isinstance(atom_, Atom):
+                raise ValueError(f"Expected list of atoms as parameter, got {type(atom_)}")
+        symbols = self._ground_symbols(solver_path)
+        res = {}
+        with _Interning(self._constants, _decoding):
+            for atom_ in atoms:
+                name = atom_.predicate.name
+                res[name] = [atom_.create_atom_from_str(symbol) for symbol in symbols.get(name, [])]
+        return res
+
+    def _ground_symbols(self, solver_path):
+        key = (self._version, len(self.rules), id(self.encoding), solver_path)
+        if self._ground_cache is not None and self._ground_cache[0] == key:
+            return self._ground_cache[1]
+        (stdout, stderr, exit_code, killed) = self._run(solver_path=solver_path, options=["--output=smodels"], timeout=None)
         if exit_code in invalid_exit_codes:
             raise ValueError(f"ASP Error: {stderr}")
         elif len(stderr) != 0:
             _print_warning(stderr)
 
-        all_atoms = []
-        lines = stdout.splitlines()
+        symbols = {}
         start_atoms = False
-        for line in lines:
-            if line == "0" and not start_atoms:
+        for line in stdout.splitlines():
+            if line == "0":
+                if start_atoms:
+                    break
                 start_atoms = True
-            elif line == "0" and start_atoms:
-                break
             elif start_atoms:
-                all_atoms.append(line.split(" ", 1)[1])
-        a = Answer(all_atoms, [], False)
-        return a.get_atom_occurrences(atom_name)
+                symbol = line.split(" ", 1)[1]
+                name = symbol.split("(", 1)[0]
+                if name not in symbols:
+                    symbols[name] = []
+                symbols[name].append(symbol)
+        self._ground_cache = (key, symbols)
+        return symbols
 
 
 class Answer:
 
-    def __init__(self, answer_set, costs, optimal):
+    def __init__(self, answer_set, costs, optimal, constants=None):
         self._answer_set = answer_set
         self.costs = costs
         self.optimal = optimal
+        self._constants = constants
 
-    def get_atom_occurrences(self, atom_name):
+    def get_atom_occurrences(self, atom_name, lazy=False):
         if not isinstance(atom_name, Atom):
             raise ValueError("Expected atom as parameter")
         res = []
-        for at in self._answer_set:
-            if at.startswith(atom_name.predicate.name):
-                res.append(atom_name.create_atom_from_str(at))
+        with _Interning(self._constants, _decoding):
+            for at in self._answer_set:
+                if at.startswith(atom_name.predicate.name):
+                    if lazy:
+                        res.append(AtomView(atom_name, at, constants=self._constants))
+                    else:
+                        res.append(atom_name.create_atom_from_str(at))
         return res
 
-    def get_class_occurrences(self, atom_name):
+    def get_class_occurrences(self, atom_name, lazy=False):
         if not isinstance(atom_name, Atom):
             raise ValueError("Expected atom as parameter")
         res = []
-        for at in self._answer_set:
-            if at.startswith(atom_name.predicate.name):
-                res.append(atom_name.create_atom_from_str(at).to_python_class())
+        with _Interning(self._constants, _decoding):
+            for at in self._answer_set:
+                if at.startswith(atom_name.predicate.name):
+                    if lazy:
+                        res.append(AtomView(atom_name, at, python_class=True, constants=self._constants))
+                    else:
+                        res.append(atom_name.create_atom_from_str(at).to_python_class())
         return res
 
 
@@ -707,8 +3144,7 @@ class ASPUtilities:
             if not isinstance(atom_, Atom):
                 raise ValueError(f"Expected list of atoms as parameter, got {type(atom_)}")
 
-        instance = open(filename, "r")
-        (stdout, stderr, exit_code, killed) = _run_solver(rules='\n'.join(instance.readlines()), solver_path=solver_path, options=["--outf=2"], timeout=None)
+        (stdout, stderr, exit_code, killed) = _run_solver(rules="", solver_path=solver_path, options=["--outf=2"], timeout=None, files=[filename])
         res = json.loads(stdout)
         if res['Result'] == 'SATISFIABLE':
             costs = []
@@ -722,38 +3158,537 @@ class ASPUtilities:
             return output
 
 
+class SymbolTable:
+
+    def __init__(self):
+        self.symbols = []
+        self._ids = {}
+
+    def intern(self, symbol):
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self._ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def intern_all(self, symbols):
+        return array('I', sorted([self.intern(symbol) for symbol in symbols]))
+
+    def lookup(self, ids):
+        symbols = self.symbols
+        return [symbols[i] for i in ids]
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+class CompactAnswers:
+
+    def __init__(self, symbols):
+        self._symbols = symbols
+        self._entries = []
+        self._constants = None
+
+    def append(self, atoms, costs, optimal):
+        self._entries.append((self._symbols.intern_all(atoms), costs, optimal))
+
+    def entry(self, index):
+        return self._entries[index]
+
+    def atom_ids(self, index):
+        return self.entry(index)[0]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        (ids, costs, optimal) = self.entry(index)
+        return Answer(self._symbols.lookup(ids), costs, optimal, self._constants)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class JsonlAnswers(CompactAnswers):
+
+    def __init__(self, symbols, filename):
+        CompactAnswers.__init__(self, symbols)
+        self.filename = filename
+        self._file = open(filename, "w+")
+        self._offsets = []
+        self._written = 0
+
+    def append(self, atoms, costs, optimal):
+        ids = self._symbols.intern_all(atoms)
+        self._file.seek(0, os.SEEK_END)
+        if self._written < len(self._symbols):
+            self._file.write(json.dumps({"symbols": self._symbols.symbols[self._written:]}) + "\n")
+            self._written = len(self._symbols)
+        self._offsets.append(self._file.tell())
+        self._file.write(json.dumps({"atoms": ids.tolist(), "costs": costs, "optimal": optimal}) + "\n")
+        self._file.flush()
+
+    def entry(self, index):
+        self._file.seek(self._offsets[index])
+        line = json.loads(self._file.readline())
+        return array('I', line["atoms"]), line["costs"], line["optimal"]
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @classmethod
+    def read(cls, filename):
+        symbols = []
+        with open(filename, "r") as f:
+            for line in f:
+                line = json.loads(line)
+                if "symbols" in line:
+                    symbols.extend(line["symbols"])
+                else:
+                    yield Answer([symbols[i] for i in line["atoms"]], line["costs"], line["optimal"])
+
+
 class Result:
     NO_SOLUTION = 1
     HAS_SOLUTION = 2
     UNKNOWN = 3
 
-    def __init__(self, status):
-        self.answers = []
+    def __init__(self, status, compact=False, spill=None):
         self.status = status
+        self.stopped_by = None
+        self.iterations = None
+        self.symbols = None
+        self._constants = None
+        if spill is not None:
+            self.symbols = SymbolTable()
+            self.answers = JsonlAnswers(self.symbols, spill)
+        elif compact:
+            self.symbols = SymbolTable()
+            self.answers = CompactAnswers(self.symbols)
+        else:
+            self.answers = []
+
+    def close(self):
+        if isinstance(self.answers, JsonlAnswers):
+            self.answers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
 
     def add_answer(self, answer):
-        self.answers.append(answer)
+        if self.symbols is None:
+            self.answers.append(answer)
+        else:
+            if answer._constants is not self._constants:
+                if len(self.answers) != 0:
+                    raise ValueError("Cannot mix answers with different interned constants")
+                self._set_constants(answer._constants)
+            self.answers.append(answer._answer_set, answer.costs, answer.optimal)
+
+    def _add_atoms(self, atoms, costs, optimal):
+        atoms = [a for a in atoms if not a.startswith("_pyspel_")]
+        if self.symbols is None:
+            self.answers.append(Answer(atoms, costs, optimal, self._constants))
+        else:
+            self.answers.append(atoms, costs, optimal)
+
+    def _set_constants(self, table):
+        self._constants = table
+        if self.symbols is None:
+            for answer in self.answers:
+                answer._constants = table
+        else:
+            self.answers._constants = table
+
+    def to_bytes(self, compress=True):
+        if self._constants is not None or (self.symbols is None and any(a._constants is not None for a in self.answers)):
+            raise ValueError("Cannot serialize a result with interned constants")
+        symbols = self.symbols
+        if symbols is None:
+            symbols = SymbolTable()
+            answers = [([symbols.intern(a) for a in answer._answer_set], answer.costs, answer.optimal) for answer in self.answers]
+        else:
+            answers = []
+            for i in range(len(self.answers)):
+                (ids, costs, optimal) = self.answers.entry(i)
+                answers.append((ids.tolist(), costs, optimal))
+        payload = (self.status, self.symbols is not None, _policy_data(self.stopped_by), symbols.symbols, answers)
+        return _wire_dumps(ord("R"), payload, compress)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (status, compact, stopped_by, symbols, answers) = _wire_loads(ord("R"), data)
+        r = Result(status, compact=compact)
+        r.stopped_by = _load_policy(stopped_by)
+        if compact:
+            for symbol in symbols:
+                r.symbols.intern(symbol)
+            for (ids, costs, optimal) in answers:
+                r.answers._entries.append((array('I', ids), costs, optimal))
+        else:
+            for (ids, costs, optimal) in answers:
+                r.answers.append(Answer([symbols[i] for i in ids], costs, optimal))
+        return r
+
+    def __reduce__(self):
+        return _load_result, (self.to_bytes(compress=False),)
+
+    def diff(self, previous, current):
+        if self.symbols is None:
+            old = set(self.answers[previous]._answer_set)
+            new = set(self.answers[current]._answer_set)
+            return sorted(new - old), sorted(old - new)
+        old = set(self.answers.atom_ids(previous))
+        new = set(self.answers.atom_ids(current))
+        return self.symbols.lookup(sorted(new - old)), self.symbols.lookup(sorted(old - new))
+
+
+def _load_problem(data):
+    return Problem.from_bytes(data)
+
+
+def _load_result(data):
+    return Result.from_bytes(data)
+
+
+def _split_symbols(text, separator):
+    symbols = []
+    depth = 0
+    start = 0
+    quoted = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quoted:
+            if c == "\\":
+                i += 1
+            elif c == '"':
+                quoted = False
+        elif c == '"':
+            quoted = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == separator and depth == 0:
+            symbols.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    symbols.append(text[start:].strip())
+    return [symbol for symbol in symbols if symbol != ""]
+
+
+def _level_costs(pairs):
+    return [weight for (level, weight) in sorted(pairs, reverse=True)]
+
+
+def _competition_costs(tokens):
+    if all("@" in token for token in tokens):
+        return _level_costs([tuple(reversed([int(v) for v in token.split("@")])) for token in tokens])
+    return [int(token) for token in tokens]
+
+
+def _is_clingo(solver_path):
+    return solver_path is None or os.path.basename(solver_path).startswith("clingo")
+
+
+class OutputAdapter(abc.ABC):
+    options = []
+
+    def solver_options(self, solver_path):
+        return self.options
+
+    @abc.abstractmethod
+    def parse(self, stdout, killed, compact=False, spill=None):
+        pass
+
+    def _result(self, models, optimal, status, compact, spill):
+        if status == Result.HAS_SOLUTION and len(models) == 0:
+            status = Result.UNKNOWN
+        if status != Result.HAS_SOLUTION:
+            return Result(status)
+        r = Result(Result.HAS_SOLUTION, compact=compact, spill=spill)
+        with _span("answers", atoms=sum([len(atoms) for (atoms, costs) in models])):
+            for (atoms, costs) in models:
+                r._add_atoms(atoms, costs, optimal)
+        return r
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ClingoOutput(OutputAdapter):
+    options = ["--outf=2", "--quiet=0,1"]
+
+    def parse(self, stdout, killed, compact=False, spill=None):
+        res = json.loads(stdout)
+        if res['Result'] == 'UNSATISFIABLE':
+            return Result(Result.NO_SOLUTION)
+        elif res['Result'] == 'SATISFIABLE' or res['Result'] == 'OPTIMUM FOUND':
+            models = [(w['Value'], w.get('Costs', [])) for w in res['Call'][0]['Witnesses'] if 'Value' in w]
+            return self._result(models, res['Result'] == 'OPTIMUM FOUND', Result.HAS_SOLUTION, compact, spill)
+        else:
+            return Result(Result.UNKNOWN)
+
+    def __str__(self):
+        return "ClingoOutput()"
+
+
+class CompetitionOutput(OutputAdapter):
+
+    def __init__(self, options=None):
+        self.options = [] if options is None else options
+
+    def solver_options(self, solver_path):
+        if _is_clingo(solver_path) and "--outf" not in [_option_name(opt) for opt in self.options]:
+            return self.options + ["--outf=1"]
+        return self.options
+
+    def parse(self, stdout, killed, compact=False, spill=None):
+        models = []
+        optimal = False
+        status = Result.UNKNOWN
+        answer = False
+        for line in stdout.splitlines():
+            line = line.strip()
+            if line.startswith("%"):
+                continue
+            if answer:
+                models.append((_split_symbols(line, "."), []))
+                answer = False
+            elif line == "ANSWER":
+                answer = True
+                status = Result.HAS_SOLUTION
+            elif line.startswith("COST") and len(models) != 0:
+                models[-1] = (models[-1][0], _competition_costs(line.split()[1:]))
+            elif line == "OPTIMUM" and len(models) != 0:
+                optimal = True
+            elif line == "INCONSISTENT" or line == "INCOHERENT":
+                status = Result.NO_SOLUTION
+        if answer:
+            models.append(([], []))
+        return self._result(models, optimal, status, compact, spill)
+
+    def __str__(self):
+        return f"CompetitionOutput({self.options})"
+
+
+_dlv_costs = re.compile(r'\[(-?\d+):(-?\d+)\]')
+
+
+class DLVOutput(OutputAdapter):
+
+    def __init__(self, options=None):
+        self.options = [] if options is None else options
+
+    def parse(self, stdout, killed, compact=False, spill=None):
+        models = []
+        optimal = False
+        status = Result.UNKNOWN
+        for line in stdout.splitlines():
+            line = line.strip()
+            best = line.startswith("Best model:")
+            if best:
+                line = line[len("Best model:"):].strip()
+            if line.startswith("{") and line.endswith("}"):
+                models.append((_split_symbols(line[1:-1], ","), []))
+                status = Result.HAS_SOLUTION
+                optimal = optimal or best
+            elif line.startswith("COST") and len(models) != 0:
+                models[-1] = (models[-1][0], _competition_costs(line.split()[1:]))
+            elif line.startswith("Cost ([Weight:Level]):") and len(models) != 0:
+                models[-1] = (models[-1][0], _level_costs([(int(level), int(weight)) for (weight, level) in _dlv_costs.findall(line)]))
+            elif line == "OPTIMUM" and len(models) != 0:
+                optimal = True
+            elif line == "INCOHERENT" or line == "INCONSISTENT":
+                status = Result.NO_SOLUTION
+        return self._result(models, optimal, status, compact, spill)
+
+    def __str__(self):
+        return f"DLVOutput({self.options})"
+
+
+class StoppingPolicy:
+
+    def reset(self):
+        pass
+
+    def on_model(self, costs, elapsed):
+        return False
+
+    def on_tick(self, elapsed):
+        return False
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TargetCost(StoppingPolicy):
+
+    def __init__(self, cost):
+        if not isinstance(cost, list):
+            cost = [cost]
+        self.cost = cost
+
+    def on_model(self, costs, elapsed):
+        return len(costs) != 0 and costs <= self.cost
+
+    def __str__(self):
+        return f"TargetCost({self.cost})"
+
+
+class NoImprovement(StoppingPolicy):
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError(f"Expected positive number of seconds, got {seconds}")
+        self.seconds = seconds
+        self._last = None
+
+    def reset(self):
+        self._last = None
+
+    def on_model(self, costs, elapsed):
+        self._last = elapsed
+        return False
+
+    def on_tick(self, elapsed):
+        return self._last is not None and elapsed - self._last >= self.seconds
+
+    def __str__(self):
+        return f"NoImprovement({self.seconds})"
+
+
+class MaxImprovements(StoppingPolicy):
+
+    def __init__(self, models):
+        if models < 1:
+            raise ValueError(f"Expected at least one model, got {models}")
+        self.models = models
+        self._count = 0
+
+    def reset(self):
+        self._count = 0
+
+    def on_model(self, costs, elapsed):
+        self._count += 1
+        return self._count >= self.models
+
+    def __str__(self):
+        return f"MaxImprovements({self.models})"
+
+
+class Gap(StoppingPolicy):
+
+    def __init__(self, lower_bound, gap):
+        if gap < 0:
+            raise ValueError(f"Expected non-negative gap, got {gap}")
+        self.lower_bound = lower_bound
+        self.gap = gap
+
+    def on_model(self, costs, elapsed):
+        if len(costs) == 0:
+            return False
+        return costs[0] - self.lower_bound <= self.gap * max(abs(costs[0]), 1)
+
+    def __str__(self):
+        return f"Gap({self.lower_bound}, {self.gap})"
+
+
+@dataclass(frozen=True)
+class LazyIteration:
+    index: int
+    seconds: float
+    status: int
+    answers: int
+    constraints: int
+
+
+_status_names = {Result.NO_SOLUTION: "no_solution", Result.HAS_SOLUTION: "has_solution", Result.UNKNOWN: "unknown"}
+
+
+def load_profile(profile):
+    if isinstance(profile, dict):
+        options = profile.get("options")
+    elif isinstance(profile, list):
+        options = profile
+    else:
+        with open(profile, "r") as f:
+            options = json.load(f).get("options")
+    if not isinstance(options, list) or not all(isinstance(opt, str) for opt in options):
+        raise ValueError(f"Expected list of options in solver profile {profile}")
+    return list(options)
+
+
+def _option_name(option):
+    return option.split("=", 1)[0]
 
 
 class SolverWrapper:
 
-    def __init__(self, solver_path=None):
+    def __init__(self, solver_path=None, profile=None, dialect=Problem.GRINGO, output=None):
+        if dialect != Problem.GRINGO and dialect != Problem.ASP_CORE:
+            raise ValueError(f"Unexpected dialect {dialect}")
+        if output is None:
+            output = ClingoOutput() if dialect == Problem.GRINGO else CompetitionOutput()
+        if not isinstance(output, OutputAdapter):
+            raise ValueError(f"Expected output adapter, got {type(output)}")
         self._solver_path = solver_path
         self.killed = False
-
-    def solve(self, problem, options=None, print_solver_output=False, timeout=None):
+        self.profile = None if profile is None else load_profile(profile)
+        self.dialect = dialect
+        self.output = output
+
+    def _profile_options(self, options):
+        if self.profile is None:
+            return options
+        names = {_option_name(opt) for opt in options}
+        return [opt for opt in self.profile if _option_name(opt) not in names] + options
+
+    def solve(self, problem, options=None, print_solver_output=False, timeout=None, compact=False, spill=None, stopping=None,
+              warm_start=None):
+        with _span("solve") as span:
+            result = self._solve(problem, options, print_solver_output, timeout, compact, spill, stopping, warm_start)
+            result._set_constants(_program_constants(problem))
+            span.set(status=_status_names[result.status], answers=len(result.answers))
+        return result
+
+    def _solve(self, problem, options, print_solver_output, timeout, compact, spill, stopping, warm_start):
         self.killed = False
         if options is None:
             options = []
         if not isinstance(options, list):
             raise ValueError("Expected list of options, but received a %s" % (type(options)))
+        options = self._profile_options(options)
         for opt in options:
             if "--outf" in opt:
                 raise ValueError("Option --outf is reserved")
-
-        options.append("--outf=2")
-        options.append("--quiet=0,1")
-        (stdout, stderr, exit_code, killed) = _run_solver(str(problem), self._solver_path, options, timeout=timeout)
+        if warm_start is not None:
+            if self.dialect != Problem.GRINGO:
+                raise ValueError("Warm start requires the gringo dialect")
+            problem = _ExtendedProgram(problem, _warm_start_hints(warm_start))
+            if "--heuristic" not in [_option_name(opt) for opt in options]:
+                options.append("--heuristic=Domain")
+
+        if stopping is not None:
+            if not isinstance(self.output, ClingoOutput):
+                raise ValueError("Stopping policies require clingo output")
+            return self._solve_with_policies(problem, options, print_solver_output, timeout, compact, spill, stopping)
+        if self.dialect != Problem.GRINGO:
+            problem = _DialectProgram(problem, self.dialect)
+        options.extend(self.output.solver_options(self._solver_path))
+        (stdout, stderr, exit_code, killed) = self._run(problem, options, timeout=timeout)
         self.killed = killed
         if print_solver_output:
             print(stdout)
@@ -762,33 +3697,186 @@ class SolverWrapper:
         elif len(stderr) != 0:
             _print_warning(stderr)
 
-        res = json.loads(stdout)
-        if res['Result'] == 'UNSATISFIABLE':
-            return Result(Result.NO_SOLUTION)
-        elif res['Result'] == 'SATISFIABLE':
-            r = Result(Result.HAS_SOLUTION)
-            costs = []
-            for answer_set in res['Call'][0]['Witnesses']:
-                if 'Value' in answer_set:
-                    r.add_answer(Answer(answer_set['Value'], costs, False))
-                if 'Costs' in answer_set:
-                    for cost in answer_set['Costs']:
-                        costs.append(cost)
-                    costs = [].copy()
-            return r
-        elif res['Result'] == 'OPTIMUM FOUND':
-            r = Result(Result.HAS_SOLUTION)
-            costs = []
-            for answer_set in res['Call'][0]['Witnesses']:
-                if 'Value' in answer_set:
-                    r.add_answer(Answer(answer_set['Value'], costs, True))
-                if 'Costs' in answer_set:
-                    for cost in answer_set['Costs']:
-                        costs.append(cost)
-                    costs = [].copy()
-            return r
+        with _span("parse", chars=len(stdout)):
+            return self.output.parse(stdout, killed, compact=compact, spill=spill)
+
+    def brave(self, problem, atoms, options=None, timeout=None):
+        return self._consequences(problem, atoms, "brave", options, timeout)
+
+    def cautious(self, problem, atoms, options=None, timeout=None):
+        return self._consequences(problem, atoms, "cautious", options, timeout)
+
+    def _consequences(self, problem, atoms, mode, options, timeout):
+        if not isinstance(self.output, ClingoOutput):
+            raise ValueError(f"Computing {mode} consequences requires clingo output")
+        single = isinstance(atoms, Atom)
+        if single:
+            atoms = [atoms]
+        if not isinstance(atoms, list) and not isinstance(atoms, tuple):
+            raise ValueError(f"Expected atom or list of atoms, got {type(atoms)}")
+        options = [] if options is None else list(options)
+        for opt in options:
+            if _option_name(opt) in ("--enum-mode", "-e"):
+                raise ValueError("Option --enum-mode is reserved")
+        options.append(f"--enum-mode={mode}")
+        names = [_option_name(opt) for opt in options]
+        if "--models" not in names:
+            options.append("--models=0")
+        if "--opt-mode" not in names:
+            options.append("--opt-mode=ignore")
+        result = self.solve(problem, options=options, timeout=timeout)
+        if result.status == Result.NO_SOLUTION:
+            return None
+        if result.status != Result.HAS_SOLUTION or self.killed:
+            raise ValueError(f"Computation of {mode} consequences did not complete")
+        answer = result.answers[-1]
+        res = {atom_.predicate.name: answer.get_atom_occurrences(atom_) for atom_ in atoms}
+        if single:
+            return res[atoms[0].predicate.name]
+        return res
+
+    def count_models(self, problem, limit=0, options=None, timeout=None):
+        options = self._profile_options([] if options is None else list(options))
+        for opt in options:
+            if _option_name(opt) in ("--outf", "--quiet", "-q", "--models", "-n"):
+                raise ValueError(f"Option {_option_name(opt)} is reserved")
+        if self.dialect != Problem.GRINGO:
+            problem = _DialectProgram(problem, self.dialect)
+        if "--opt-mode" not in [_option_name(opt) for opt in options]:
+            options.append("--opt-mode=ignore")
+        options += [f"--models={limit}", "--outf=2", "--quiet=2"]
+        with _span("solve") as span:
+            (stdout, stderr, exit_code, killed) = self._run(problem, options, timeout=timeout)
+            self.killed = killed
+            if exit_code in invalid_exit_codes:
+                raise ValueError(f"ASP Error: {stderr}")
+            elif len(stderr) != 0:
+                _print_warning(stderr)
+            if killed:
+                return None
+            with _span("parse", chars=len(stdout)):
+                models = json.loads(stdout)["Models"]
+                count = models.get("Optimal", models["Number"])
+            span.set(models=count)
+        return count
+
+    def solve_lazy(self, problem, separator, options=None, timeout=None, max_iterations=None, warm_start=True):
+        if options is None:
+            options = []
+        if isinstance(problem, Problem) and problem.encoding is not None and problem._spool is None and len(problem.rules) == 0:
+            (base, owned) = (problem.encoding, False)
         else:
-            return Result(Result.UNKNOWN)
+            (base, owned) = (Encoding(str(problem)), True)
+        current = problem._derive(base) if isinstance(problem, Problem) else Problem(encoding=base)
+        iterations = []
+        previous = None
+        start = monotonic()
+        try:
+            while True:
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (monotonic() - start)
+                    if remaining <= 0:
+                        result = Result(Result.UNKNOWN)
+                        break
+                begin = monotonic()
+                result = self.solve(current, options=list(options), timeout=remaining, warm_start=previous if warm_start else None)
+                accepted = []
+                cuts = []
+                if result.status == Result.HAS_SOLUTION:
+                    candidates = list(result.answers)
+                    if len(candidates[-1].costs) != 0:
+                        candidates = candidates[-1:]
+                    for answer in candidates:
+                        new = separator(answer)
+                        if new is None:
+                            new = []
+                        elif not isinstance(new, list) and not isinstance(new, tuple):
+                            new = [new]
+                        if len(new) == 0:
+                            accepted.append(answer)
+                        cuts.extend(new)
+                iterations.append(LazyIteration(len(iterations), monotonic() - begin, result.status, len(accepted), len(cuts)))
+                if result.status != Result.HAS_SOLUTION:
+                    break
+                if len(accepted) != 0:
+                    result = Result(Result.HAS_SOLUTION)
+                    for answer in accepted:
+                        result.add_answer(answer)
+                    break
+                if max_iterations is not None and len(iterations) >= max_iterations:
+                    result = Result(Result.UNKNOWN)
+                    break
+                current += cuts
+                previous = result.answers[-1]
+        finally:
+            if owned:
+                base.close()
+        result.iterations = iterations
+        return result
+
+    def _solve_with_policies(self, problem, options, print_solver_output, timeout, compact, spill, stopping):
+        if isinstance(stopping, StoppingPolicy):
+            stopping = [stopping]
+        for policy in stopping:
+            if not isinstance(policy, StoppingPolicy):
+                raise ValueError(f"Expected stopping policy, got {type(policy)}")
+            policy.reset()
+        options = options + ["--outf=0", "-V0", "--quiet=0,0"]
+        models = []
+        state = {"status": None, "stopped_by": None}
+
+        def fire(check):
+            for policy in stopping:
+                if check(policy):
+                    state["stopped_by"] = policy
+                    return True
+            return False
+
+        def on_line(line, elapsed):
+            if print_solver_output:
+                print(line)
+            if line.startswith("Optimization: "):
+                costs = [int(c) for c in line[len("Optimization: "):].split()]
+                models[-1][1] = costs
+                return fire(lambda policy: policy.on_model(costs, elapsed))
+            if line in ("SATISFIABLE", "UNSATISFIABLE", "OPTIMUM FOUND", "UNKNOWN"):
+                state["status"] = line
+                return False
+            models.append([_answer_atoms.findall(line), []])
+            return False
+
+        def on_tick(elapsed):
+            return fire(lambda policy: policy.on_tick(elapsed))
+
+        (stderr, exit_code, killed, stopped) = self._stream(problem, options, timeout, on_line, on_tick)
+        self.killed = killed
+        if stopped:
+            pass
+        elif exit_code in invalid_exit_codes:
+            raise ValueError(f"ASP Error: {stderr}")
+        elif len(stderr) != 0:
+            _print_warning(stderr)
+
+        if state["status"] == "UNSATISFIABLE":
+            r = Result(Result.NO_SOLUTION)
+        elif len(models) == 0:
+            r = Result(Result.UNKNOWN)
+        else:
+            optimal = state["status"] == "OPTIMUM FOUND"
+            r = Result(Result.HAS_SOLUTION, compact=compact, spill=spill)
+            with _span("answers", atoms=sum([len(atoms) for (atoms, costs) in models])):
+                for (atoms, costs) in models:
+                    r._add_atoms(atoms, costs, optimal)
+        r.stopped_by = state["stopped_by"]
+        return r
+
+    def _run(self, problem, options, timeout):
+        return _run_program(problem, self._solver_path, options, timeout=timeout)
+
+    def _stream(self, problem, options, timeout, on_line, on_tick):
+        (rules, files, stdin) = _program_inputs(problem)
+        return _stream_solver(rules, self._solver_path, options, timeout, on_line, on_tick, files=files, stdin=stdin)
 
 
 def __create_atom(cls: ClassVar):
@@ -847,7 +3935,7 @@ def __create_atom(cls: ClassVar):
                       f'    raise ValueError(f"Expected str for _as, got {{type(_as)}}")',
                       f"if _as is None or len(_as) == 0:",
                       f'    _as = "__default__"',
-                      f'{class_name}.__registered[_as]=self',
+                      f'Registry.current().store(type(self), _as, self)',
                       f'return self']
         setattr(cls, "s", create_method(sig="def s(self, _as):", body=body_store, defaults=[None]))
 
@@ -855,9 +3943,10 @@ def __create_atom(cls: ClassVar):
                      f'    raise ValueError(f"Expected str for _, got {{type(_)}}")',
                      f"if _ is None or len(_) == 0:",
                      f'    _ = "__default__"',
-                     f"if _ not in {class_name}.__registered:",
+                     f"__registered = Registry.current().load(cls, _)",
+                     f"if __registered is None:",
                      f'    raise ValueError(f"{{_}} is not registered, did you forget to use _as before?")',
-                     f'return {class_name}.__registered[_]']
+                     f'return __registered']
         setattr(cls, "l", classmethod(create_method(sig="def l(cls, _):", body=body_load, defaults=[None])))
 
     def create_new_object():
@@ -874,17 +3963,18 @@ def __create_atom(cls: ClassVar):
                 f'if _as is not None:',
                 f'    if len(_as) == 0:',
                 f'        _as = "__default__"',
-                f'    {class_name}.__registered[_as]=self',
+                f'    Registry.current().store(type(self), _as, self)',
                 f'if _ is not None:',
                 f'    if len(_) == 0:',
                 f'        _ = "__default__"',
-                f'    if _ not in {class_name}.__registered:',
+                f'    __registered = Registry.current().load(type(self), _)',
+                f'    if __registered is None:',
                 f'        raise ValueError(f"{{_}} is not registered, did you forget to use _as before?")']
         for arg in init_args:
             if arg != "_" and arg != "_as":
                 body.append(f'    if {arg} is not None:')
                 body.append(f'        raise ValueError("if _ is used all parameters must be None")')
-                body.append(f'    self.{arg} = {class_name}.__registered[_].{arg}')
+                body.append(f'    self.{arg} = __registered.{arg}')
         body.append(f'    return')
         if len(init_args) > 0:
             args = 'self, ' + ', '.join(init_args)
@@ -903,7 +3993,6 @@ def __create_atom(cls: ClassVar):
                 break
         f = FunctionType(c, globals_)
         f.__defaults__ = tuple([None for _ in init_args])
-        setattr(cls, "__registered", dict())
         setattr(cls, "__init__", f)
         create_load_store_methods()
 
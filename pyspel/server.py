@@ -0,0 +1,249 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+from collections import OrderedDict
+
+from pyspel.pyspel import Encoding, Problem, SolverWrapper, _run_solver
+
+_header = struct.Struct("!I")
+
+
+def _send(connection, message):
+    data = json.dumps(message).encode()
+    connection.sendall(_header.pack(len(data)) + data)
+
+
+def _receive(connection):
+    header = _receive_exactly(connection, _header.size)
+    if header is None:
+        return None
+    data = _receive_exactly(connection, _header.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data.decode())
+
+
+def _receive_exactly(connection, size):
+    chunks = []
+    while size > 0:
+        chunk = connection.recv(min(size, 1 << 20))
+        if len(chunk) == 0:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class _Job:
+
+    def __init__(self, program, encoding, options, timeout):
+        self.program = program
+        self.encoding = encoding
+        self.options = options
+        self.timeout = timeout
+        self.output = None
+        self.done = threading.Event()
+
+
+class SolveServer:
+
+    def __init__(self, socket_path, workers=None, solver_path=None, max_timeout=None, max_encodings=64):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError(f"Expected at least one worker, got {workers}")
+        self.socket_path = socket_path
+        self.workers = workers
+        self.solver_path = solver_path
+        self.max_timeout = max_timeout
+        self.max_encodings = max_encodings
+        self._jobs = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._encodings = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = None
+        self._threads = []
+
+    def _get_encoding(self, digest):
+        with self._lock:
+            encoding = self._encodings.get(digest)
+            if encoding is not None:
+                self._encodings.move_to_end(digest)
+            return encoding
+
+    def _add_encoding(self, program):
+        encoding = Encoding(program)
+        with self._lock:
+            self._encodings[encoding.digest] = encoding
+            while len(self._encodings) > self.max_encodings:
+                self._encodings.popitem(last=False)[1].close()
+        return encoding
+
+    def _timeout(self, timeout):
+        if self.max_timeout is None:
+            return timeout
+        if timeout is None:
+            return self.max_timeout
+        return min(timeout, self.max_timeout)
+
+    def _work(self):
+        while True:
+            (priority, sequence, job) = self._jobs.get()
+            if job is None:
+                break
+            files = None
+            if job.encoding is not None:
+                files = [job.encoding.filename]
+            try:
+                job.output = list(_run_solver(job.program, self.solver_path, job.options, job.timeout, files=files))
+            except Exception as e:
+                job.output = ["", f"pyspel server error: {e}", 1, False]
+            job.done.set()
+
+    def submit(self, program, encoding=None, options=None, timeout=None, priority=0):
+        if options is None:
+            options = []
+        job = _Job(program, encoding, options, self._timeout(timeout))
+        self._jobs.put((priority, next(self._sequence), job))
+        return job
+
+    def _handle(self, message):
+        if message.get("op") != "solve":
+            return {"error": f"Unexpected operation {message.get('op')}"}
+        encoding = None
+        if message.get("encoding") is not None:
+            encoding = self._get_encoding(message["encoding"])
+            if encoding is None:
+                if message.get("encoding_program") is None:
+                    return {"missing": True}
+                encoding = self._add_encoding(message["encoding_program"])
+        job = self.submit(message["program"], encoding, message.get("options"), message.get("timeout"), message.get("priority", 0))
+        job.done.wait()
+        return {"output": job.output}
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+
+            def handle(self):
+                while True:
+                    message = _receive(self.request)
+                    if message is None:
+                        break
+                    _send(self.request, server._handle(message))
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._threads[-1].join()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for _ in range(self.workers):
+            self._jobs.put((float("inf"), next(self._sequence), None))
+        with self._lock:
+            for encoding in self._encodings.values():
+                encoding.close()
+            self._encodings.clear()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+
+class RemoteSolverWrapper(SolverWrapper):
+
+    def __init__(self, socket_path, priority=0, profile=None):
+        SolverWrapper.__init__(self, profile=profile)
+        self.socket_path = socket_path
+        self.priority = priority
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._connection.connect(self.socket_path)
+        return self._connection
+
+    def _request(self, message):
+        with self._lock:
+            connection = self._connect()
+            try:
+                _send(connection, message)
+                response = _receive(connection)
+            except OSError:
+                self.close()
+                raise
+            if response is None:
+                self.close()
+                raise ValueError("Connection closed by pyspel server")
+            return response
+
+    def _run(self, problem, options, timeout):
+        message = {"op": "solve", "options": options, "timeout": timeout, "priority": self.priority, "encoding": None}
+        if isinstance(problem, Problem) and problem.encoding is not None:
+            message["program"] = problem._render_rules()
+            message["encoding"] = problem.encoding.digest
+        else:
+            message["program"] = str(problem)
+        response = self._request(message)
+        if response.get("missing"):
+            message["encoding_program"] = problem.encoding.program
+            response = self._request(message)
+        if "error" in response:
+            raise ValueError(f"pyspel server error: {response['error']}")
+        return tuple(response["output"])
+
+    def _stream(self, problem, options, timeout, on_line, on_tick):
+        raise ValueError("Stopping policies are not supported by the pyspel server")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pyspel solve server")
+    parser.add_argument("--socket", required=True, help="path of the unix socket to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="number of concurrent solver processes")
+    parser.add_argument("--solver-path", default=None, help="path of the solver executable")
+    parser.add_argument("--max-timeout", type=float, default=None, help="upper bound on the timeout of each job")
+    parser.add_argument("--max-encodings", type=int, default=64, help="number of cached encodings")
+    args = parser.parse_args()
+    SolveServer(socket_path=args.socket, workers=args.workers, solver_path=args.solver_path, max_timeout=args.max_timeout,
+                max_encodings=args.max_encodings).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
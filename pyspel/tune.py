@@ -0,0 +1,153 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from pyspel.pyspel import Problem, Result, SolverWrapper
+
+DEFAULT_SPACE = {
+    "--configuration": ["auto", "frumpy", "jumpy", "tweety", "handy", "crafty", "trendy"],
+    "--opt-strategy": [None, "bb", "usc"],
+    "--heuristic": [None, "Vsids", "Berkmin"],
+    "--parallel-mode": [None, "2", "4"],
+}
+
+
+def configurations(space=None, samples=None, seed=None):
+    if space is None:
+        space = DEFAULT_SPACE
+    names = list(space)
+    grid = list(itertools.product(*[[[] if value is None else [f"{name}={value}"] for value in space[name]] for name in names]))
+    configs = [[opt for group in config for opt in group] for config in grid]
+    if [] in configs:
+        configs.remove([])
+    if samples is not None and samples < len(configs):
+        configs = random.Random(seed).sample(configs, samples)
+    return [[]] + configs
+
+
+class Trial:
+
+    def __init__(self, options, runs):
+        self.options = options
+        self.times = [None] * runs
+        self.costs = [None] * runs
+        self.solved = [False] * runs
+
+    @property
+    def complete(self):
+        return all(t is not None for t in self.times)
+
+    @property
+    def failures(self):
+        return len([s for s in self.solved if not s])
+
+    def penalized_time(self, timeout, penalty=2):
+        return sum([t if s else timeout * penalty for (t, s) in zip(self.times, self.solved) if t is not None])
+
+    def total_cost(self):
+        total = []
+        for costs in self.costs:
+            if costs is None:
+                continue
+            total = [a + b for (a, b) in itertools.zip_longest(total, costs, fillvalue=0)]
+        return total
+
+    def key(self, objective, timeout):
+        if not self.complete:
+            return 2, 0, [], 0
+        if objective == "time":
+            return 0, self.failures, [], self.penalized_time(timeout)
+        missing = len([c for (c, s) in zip(self.costs, self.solved) if c is None and not s])
+        return 0, missing, self.total_cost(), self.penalized_time(timeout)
+
+    def to_profile(self, objective, timeout):
+        return {"version": 1, "options": self.options, "objective": objective, "timeout": timeout, "instances": len(self.times),
+                "failures": self.failures, "time": self.penalized_time(timeout), "cost": self.total_cost()}
+
+    def __str__(self):
+        return " ".join(self.options) if len(self.options) != 0 else "<default>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _run(solver, program, options, timeout):
+    start = monotonic()
+    result = solver.solve(program, options=options + [f"--time-limit={math.ceil(timeout)}"], timeout=timeout + 10)
+    elapsed = monotonic() - start
+    if result.status == Result.NO_SOLUTION:
+        return elapsed, None, True
+    if result.status != Result.HAS_SOLUTION:
+        return elapsed, None, False
+    last = result.answers[-1]
+    optimal = last.optimal or len(last.costs) == 0
+    return elapsed, list(last.costs), optimal and elapsed < timeout
+
+
+def tune(problems, space=None, objective="time", timeout=10, budget=None, samples=None, workers=None, solver_path=None, seed=None,
+         profile=None):
+    if objective not in ("time", "cost"):
+        raise ValueError(f"Expected objective time or cost, got {objective}")
+    if len(problems) == 0:
+        raise ValueError("Expected at least one problem to tune on")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    programs = [p if not isinstance(p, Problem) or p.encoding is not None else str(p) for p in problems]
+    trials = [Trial(options, len(programs)) for options in configurations(space, samples, seed)]
+    solver = SolverWrapper(solver_path=solver_path)
+    deadline = None if budget is None else monotonic() + budget
+    lock = threading.Lock()
+
+    def run(trial, i):
+        if deadline is not None and monotonic() >= deadline:
+            return
+        (elapsed, costs, solved) = _run(solver, programs[i], trial.options, timeout)
+        with lock:
+            trial.times[i] = elapsed
+            trial.costs[i] = costs
+            trial.solved[i] = solved
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run, trial, i) for trial in trials for i in range(len(programs))]
+        for future in futures:
+            future.result()
+
+    ranking = sorted([t for t in trials if t.complete], key=lambda t: t.key(objective, timeout))
+    if profile is not None and len(ranking) != 0:
+        with open(profile, "w") as f:
+            json.dump(ranking[0].to_profile(objective, timeout), f, indent=2)
+    return ranking
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pyspel solver option tuner")
+    parser.add_argument("instances", nargs="+", help="ASP programs used as tuning sample")
+    parser.add_argument("--profile", required=True, help="path of the json profile to write")
+    parser.add_argument("--objective", choices=["time", "cost"], default="time", help="ranking criterion")
+    parser.add_argument("--timeout", type=float, default=10, help="time limit of each solver run")
+    parser.add_argument("--budget", type=float, default=None, help="overall time budget of the search")
+    parser.add_argument("--samples", type=int, default=None, help="number of sampled configurations")
+    parser.add_argument("--workers", type=int, default=None, help="number of concurrent solver processes")
+    parser.add_argument("--solver-path", default=None, help="path of the solver executable")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the configuration sampling")
+    args = parser.parse_args()
+    problems = []
+    for filename in args.instances:
+        problem = Problem()
+        with open(filename, "r") as f:
+            problem += f.read()
+        problems.append(problem)
+    ranking = tune(problems, objective=args.objective, timeout=args.timeout, budget=args.budget, samples=args.samples,
+                   workers=args.workers, solver_path=args.solver_path, seed=args.seed, profile=args.profile)
+    for trial in ranking:
+        print(f"{trial.penalized_time(args.timeout):.3f}s failures={trial.failures} cost={trial.total_cost()} {trial}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+from pyspel.pyspel import _check_rules
+
+requires_clingo = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Pair:
+    first: any
+    second: any
+
+
+@atom
+class Vertex:
+    value: int
+
+
+@atom
+class Degree:
+    value: int
+
+
+def _aggregate_bound_in_element():
+    with Vertex() as v:
+        return When(Count({v.value: v}) == v.value).define(Degree(v.value))
+
+
+@pytest.mark.parametrize("rule", [
+    lambda: Define(Pair(1.5, 2)),
+    lambda: Define(Pair('a"b', 1)),
+    lambda: Define(Pair((1, "x"), 1)),
+])
+def test_unsupported_terms_are_not_decided(rule):
+    (decided, errors, warnings) = _check_rules([rule()])
+    assert not decided
+    assert errors == []
+
+
+def _list_condition():
+    (x, y) = (var("X"), var("Y"))
+    return When(Vertex(x), {Pair(x, y): [Vertex(y), y == x]}).define(Degree(x))
+
+
+def test_list_condition_is_not_decided():
+    (decided, errors, warnings) = _check_rules([_list_condition()])
+    assert not decided
+
+
+def test_boolean_term_is_an_unsafe_variable():
+    (decided, errors, warnings) = _check_rules([Define(Pair(True, 1))])
+    assert decided
+    assert len(errors) == 1 and "True" in errors[0]
+
+
+def test_aggregate_bound_variable_used_in_element_is_unsafe():
+    (decided, errors, warnings) = _check_rules([_aggregate_bound_in_element()])
+    assert decided
+    assert len(errors) == 1 and "unsafe" in errors[0]
+
+
+def test_aggregate_assignment_binds_variable():
+    with Vertex() as v, Degree() as d:
+        rule = When(Count({v.value: v}) == d.value).define(d)
+    assert _check_rules([rule]) == (True, [], [])
+
+
+def test_valid_program_is_decided_statically():
+    p = Problem()
+    p += [Pair(1, "a"), Vertex(1)]
+    with Vertex() as v:
+        p += When(v).define(Degree(v.value + 1))
+    assert _check_rules(p.rules) == (True, [], [])
+
+
+@requires_clingo
+@pytest.mark.parametrize("rule", [
+    lambda: Define(Pair(1.5, 2)),
+    lambda: Define(Pair('a"b', 1)),
+    _aggregate_bound_in_element,
+    _list_condition,
+])
+def test_check_rejects_programs_clingo_rejects(rule):
+    p = Problem()
+    p += rule()
+    with pytest.raises(ValueError):
+        p.check()
+
+
+@requires_clingo
+def test_check_accepts_valid_program():
+    p = Problem()
+    p += [Vertex(1), Vertex(2)]
+    with Vertex() as v:
+        p += When(v).define(Degree(v.value))
+    p.check()
+    assert len(SolverWrapper().solve(p).answers[0].get_atom_occurrences(Degree())) == 2
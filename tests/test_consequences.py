@@ -0,0 +1,62 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+pytestmark = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Switch:
+    value: int
+
+
+@atom
+class On:
+    switch: Switch
+
+
+def _problem(weak=False):
+    p = Problem()
+    p += [Switch(i) for i in range(1, 4)]
+    with Switch() as s:
+        p += When(s).guess({On(s)})
+    p += Assert(On(Switch(1)), On(Switch(2)))
+    if weak:
+        p += Assert(~On(Switch(3))).otherwise(1, 1, 3)
+    return p
+
+
+def _answers(problem):
+    result = SolverWrapper().solve(problem, options=["0", "--opt-mode=ignore"])
+    return [{str(a) for a in answer.get_atom_occurrences(On())} for answer in result.answers]
+
+
+@pytest.mark.parametrize("weak", [False, True])
+def test_consequences_match_enumeration(weak):
+    p = _problem(weak)
+    answers = _answers(p)
+    solver = SolverWrapper()
+    assert {str(a) for a in solver.brave(p, On())} == set.union(*answers)
+    assert {str(a) for a in solver.cautious(p, [On()])["on"]} == set.intersection(*answers)
+
+
+@pytest.mark.parametrize("weak", [False, True])
+def test_count_models_ignores_optimization(weak):
+    p = _problem(weak)
+    solver = SolverWrapper()
+    assert solver.count_models(p) == len(_answers(p)) == 6
+    assert solver.count_models(p, limit=2) == 2
+
+
+def test_count_optimal_models():
+    assert SolverWrapper().count_models(_problem(weak=True), options=["--opt-mode=optN"]) == 3
+
+
+def test_unsatisfiable_consequences():
+    p = _problem()
+    p += Assert(~On(Switch(1)))
+    p += Assert(~On(Switch(2)))
+    assert SolverWrapper().brave(p, On()) is None
+    assert SolverWrapper().count_models(p) == 0
@@ -0,0 +1,100 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+requires_clingo = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Item:
+    value: int
+
+
+@atom
+class Chosen:
+    item: Item
+
+
+def _problem():
+    p = Problem()
+    p += [Item(i) for i in range(1, 4)]
+    with Item() as i:
+        p += When(i).guess({Chosen(i)})
+    with Item() as i, Item() as j:
+        p += When(Chosen(i), Chosen(j)).holds(i.value == j.value)
+    with Item() as i:
+        p += Assert(~Chosen(i)).when(i).otherwise(i.value, 1, i.value)
+    p += Assert(Chosen(Item(1)), Chosen(Item(2)))
+    return p
+
+
+def _atoms(result):
+    return sorted([str(a) for a in result.answers[-1].get_atom_occurrences(Chosen())])
+
+
+def test_core_rendering():
+    text = _problem().render(Problem.ASP_CORE)
+    assert ";" not in text
+    assert " :- X0 <> X1, chosen(item(X0)), chosen(item(X1))." in text
+    assert "not X0" not in text
+    assert Problem().render(Problem.ASP_CORE) == ""
+    p = Problem()
+    p += "a ; b :- c, d, not X < 2, not not Y = 1; #count{Z : g(Z), not Z != 1} = 1."
+    assert p.render(Problem.ASP_CORE) == "a | b :- c, d, X >= 2, Y = 1, #count{Z : g(Z), Z = 1} = 1.\n"
+
+
+@pytest.mark.parametrize("rule", ["e :- f : g(X); h.", "p(1..3).", ":- p(X), |X| > 1.", ":- p(X), X \\ 2 = 0.", ":- p(X), X ** 2 = 4."])
+def test_core_rejects_gringo_constructs(rule):
+    p = Problem()
+    p += rule
+    with pytest.raises(ValueError):
+        p.render(Problem.ASP_CORE)
+
+
+@requires_clingo
+def test_core_dialect_round_trip():
+    expected = SolverWrapper().solve(_problem())
+    result = SolverWrapper(dialect=Problem.ASP_CORE).solve(_problem())
+    assert result.status == expected.status == Result.HAS_SOLUTION
+    assert _atoms(result) == _atoms(expected) == ["chosen(item(1))"]
+    assert result.answers[-1].costs == expected.answers[-1].costs == [1]
+    assert result.answers[-1].optimal
+
+
+@requires_clingo
+def test_core_dialect_unsatisfiable_and_satisfiable():
+    solver = SolverWrapper(dialect=Problem.ASP_CORE)
+    p = Problem()
+    p += "a :- not b. b :- not a."
+    assert solver.solve(p).status == Result.HAS_SOLUTION
+    p += ":- a. :- b."
+    assert solver.solve(p).status == Result.NO_SOLUTION
+
+
+def test_competition_output():
+    output = CompetitionOutput()
+    r = output.parse('ANSWER\np("a. b"). q(1,2).\nCOST 5@1 2@2\nANSWER\nq(1,2).\nCOST 3@1 1@2\nOPTIMUM\n', False)
+    assert r.status == Result.HAS_SOLUTION
+    assert [(a._answer_set, a.costs, a.optimal) for a in r.answers] == [(['p("a. b")', "q(1,2)"], [2, 5], True),
+                                                                        (["q(1,2)"], [1, 3], True)]
+    assert output.parse("INCONSISTENT\n", False).status == Result.NO_SOLUTION
+    assert output.parse("", False).status == Result.UNKNOWN
+    assert output.parse("% Solving...\nANSWER\n\n", False).answers[0]._answer_set == []
+    assert "--outf=1" in output.solver_options(None)
+    assert output.solver_options("/usr/bin/dlv2") == []
+
+
+def test_dlv_output():
+    output = DLVOutput()
+    r = output.parse('{a, b(1,"x, y")}\nCost ([Weight:Level]): <[4:1],[2:2]>\nBest model: {a, c}\nCost ([Weight:Level]): <[1:1],[1:2]>\n', False)
+    assert r.status == Result.HAS_SOLUTION
+    assert [(a._answer_set, a.costs, a.optimal) for a in r.answers] == [(["a", 'b(1,"x, y")'], [2, 4], True), (["a", "c"], [1, 1], True)]
+    assert output.parse("INCOHERENT\n", False).status == Result.NO_SOLUTION
+    assert output.parse("", True).status == Result.UNKNOWN
+
+
+def test_output_adapter_is_abstract():
+    with pytest.raises(TypeError):
+        OutputAdapter()
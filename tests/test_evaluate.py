@@ -0,0 +1,106 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+pytestmark = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Vertex:
+    value: int
+
+
+@atom
+class Arc:
+    first: Vertex
+    second: Vertex
+
+
+@atom
+class Reach:
+    vertex: Vertex
+
+
+@atom
+class Tint:
+    value: int
+
+
+@atom
+class Paint:
+    vertex: Vertex
+    tint: Tint
+
+
+def _problem():
+    p = Problem()
+    p += [Vertex(i) for i in range(1, 7)]
+    p += [Arc(Vertex(i), Vertex(i + 1)) for i in range(1, 5)]
+    p += [Tint(1), Tint(2)]
+    p += Reach(Vertex(1))
+    with Vertex() as a, Vertex() as b:
+        p += When(Reach(a), Arc(a, b), b).define(Reach(b))
+    with Vertex() as v, Tint() as t:
+        p += When(t).guess({Paint(v, t): v}, exactly=2)
+    with Vertex() as a, Vertex() as b, Tint() as t:
+        p += When(Paint(a, t), Paint(b, t), Arc(a, b), Reach(b)).holds(False)
+    return p
+
+
+def _models(problem):
+    result = SolverWrapper().solve(problem, options=["0"])
+    return sorted([sorted([str(a) for a in answer.get_atom_occurrences(Paint())]) for answer in result.answers])
+
+
+def test_choice_conditions_do_not_block_evaluation():
+    evaluated = _problem().evaluate()
+    text = str(evaluated)
+    assert "reach(vertex(5))." in text
+    assert not any(line.startswith("reach(vertex(X") for line in text.splitlines())
+
+
+def test_evaluated_problem_has_the_same_models():
+    p = _problem()
+    assert _models(p.evaluate()) == _models(p)
+    assert len(_models(p)) == 121
+
+
+@atom
+class Queue:
+    vertex: Vertex
+    label: str
+
+
+@atom
+class Before:
+    first: Vertex
+    second: Vertex
+
+
+def _ordered():
+    p = Problem()
+    p += [Queue(Vertex(i), label) for (i, label) in [(1, "b"), (2, "a"), (3, "c")]]
+    (x, y, l, m) = (var("X"), var("Y"), var("L"), var("M"))
+    p += Define(Before(x, y)).when(Queue(x, l), Queue(y, m), x < y, l < m)
+    return p
+
+
+def test_evaluate_orders_function_terms_like_clingo():
+    p = _ordered()
+    evaluated = p.evaluate()
+    text = str(evaluated)
+    assert "before(vertex(1), vertex(3))." in text
+    assert "before(vertex(2), vertex(3))." in text
+    assert "before(vertex(1), vertex(2))." not in text
+    result = SolverWrapper().solve(p)
+    expected = sorted([str(a) for a in result.answers[-1].get_atom_occurrences(Before())])
+    result = SolverWrapper().solve(evaluated)
+    assert sorted([str(a) for a in result.answers[-1].get_atom_occurrences(Before())]) == expected
+
+
+def test_evaluated_facts_are_sorted():
+    facts = [line for line in str(_problem().evaluate()).splitlines() if line.startswith("reach(")]
+    assert facts == sorted(facts)
+    assert len(facts) == 5
@@ -0,0 +1,53 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+requires_clingo = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Cell:
+    value: int
+
+
+@atom
+class Pick:
+    value: int
+
+
+def _rules():
+    rules = [Define(Cell(i)) for i in range(1, 5)]
+    rules.append(Guess({Pick(i) for i in range(1, 5)}, at_least=2))
+    for i in range(1, 5):
+        for j in range(1, 5):
+            rules.append(When(Pick(i), Pick(j), Cell(i).value < Cell(j).value, Term(i) + Term(j) * 2 == 7).holds(False))
+    with Cell() as c:
+        rules.append(When(c, Pick(c.value), c.value + (Term(2) - Term(1)) > 4).holds(False))
+    return rules
+
+
+def test_constant_folding():
+    assert str(Term(3) + Term(4) * 2) == "11"
+    with Cell() as c:
+        assert str(When(c, c.value > Term(2) - Term(1)).holds(False)) == " :- cell(X0); X0 > 1."
+    assert str(When(Pick(1), Cell(1).value < Cell(2).value).holds(False)) == " :- pick(1)."
+    assert str(When(Pick(1), Cell(2).value < Cell(1).value).holds(False)) == ""
+
+
+@requires_clingo
+def test_folded_program_has_the_same_models():
+    folded = Problem()
+    folded += _rules()
+    unfolded = Problem()
+    for rule in _rules():
+        head = rule.get_head() or ""
+        unfolded += f"{head} :- {rule.get_body()}." if len(rule._body) != 0 else str(rule)
+    text = str(folded)
+    assert " < " not in text and "= 7" not in text
+    assert len([line for line in text.splitlines() if line != ""]) < len([line for line in str(unfolded).splitlines() if line != ""])
+    expected = SolverWrapper().solve(unfolded, options=["0"])
+    result = SolverWrapper().solve(folded, options=["0"])
+    assert sorted([sorted(a._answer_set) for a in result.answers]) == sorted([sorted(a._answer_set) for a in expected.answers])
+    assert len(result.answers) == 2
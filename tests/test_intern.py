@@ -0,0 +1,106 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+requires_clingo = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Shade:
+    name: str
+
+
+@atom
+class Label:
+    value: any
+
+
+@atom
+class Paint:
+    node: int
+    shade: Shade
+
+
+def _problem(intern=True):
+    p = Problem(intern=intern)
+    p += [Shade("red"), Shade("green"), Label("red")]
+    with Shade() as s:
+        p += Guess({Paint(1, s): s}, exactly=1)
+    p += Assert(Paint(1, Shade("green")))
+    return p
+
+
+@requires_clingo
+def test_solve_round_trip():
+    p = _problem()
+    assert '"' not in str(p)
+    result = SolverWrapper().solve(p)
+    with pytest.raises(ValueError):
+        result.to_bytes()
+    answer = result.answers[-1]
+    assert [str(a) for a in answer.get_atom_occurrences(Paint())] == ['paint(1, shade("green"))']
+    assert answer.get_atom_occurrences(Label())[0].value.value == "red"
+    view = answer.get_atom_occurrences(Paint(), lazy=True)[0]
+    assert view.shade.name.value == "green"
+    assert [str(a) for a in SolverWrapper().solve(p, compact=True).answers[-1].get_atom_occurrences(Shade())] == \
+           ['shade("red")', 'shade("green")']
+
+
+@requires_clingo
+def test_other_problems_are_not_decoded():
+    str(_problem())
+    p = Problem()
+    p += Label(0)
+    answer = SolverWrapper().solve(p).answers[-1]
+    assert answer.get_atom_occurrences(Label())[0].value.value == 0
+    q = Problem(intern=True)
+    q += Label(0)
+    answer = SolverWrapper().solve(q).answers[-1]
+    assert answer.get_atom_occurrences(Label())[0].value.value == 0
+
+
+def test_rejects_string_constants_as_text():
+    p = _problem()
+    with pytest.raises(ValueError):
+        p += ':- shade("red").'
+    with pytest.raises(ValueError):
+        Problem(encoding=Encoding('shade("blue").'), intern=True)
+    p += ":- paint(1, shade(X)), not shade(X)."
+    with pytest.raises(ValueError):
+        _problem().to_bytes()
+
+
+@atom
+class Weight:
+    value: int
+
+
+@atom
+class Clash:
+    pass
+
+
+@requires_clingo
+def test_strings_and_integers_do_not_join():
+    for intern in (False, True):
+        p = Problem(intern=intern)
+        p += [Shade("red"), Weight(0)]
+        with Shade() as s:
+            p += Define(Clash()).when(s, Weight(s.name))
+        answer = SolverWrapper().solve(p).answers[-1]
+        assert answer.get_atom_occurrences(Clash()) == []
+        assert [a.value.value for a in answer.get_atom_occurrences(Weight())] == [0]
+
+
+def test_rejects_ordering_of_interned_variables():
+    p = Problem(intern=True)
+    with Shade() as s, Shade() as t:
+        p += Define(Clash()).when(s, t, s.name < t.name)
+    with pytest.raises(ValueError):
+        str(p)
+    q = Problem(intern=True)
+    with Weight() as v, Weight() as w:
+        q += Define(Clash()).when(v, w, v.value < w.value)
+    assert "X0 < X1" in str(q)
@@ -0,0 +1,75 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+pytestmark = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Spot:
+    value: int
+
+
+@atom
+class Fill:
+    spot: int
+    color: str
+
+
+def _problem():
+    p = Problem()
+    p += [Spot(i) for i in range(1, 4)]
+    with Spot() as s:
+        p += When(s).guess({Fill(s.value, "r"), Fill(s.value, "g")}, exactly=1)
+    for (i, j) in [(1, 2), (2, 3)]:
+        for c in ["r", "g"]:
+            p += Assert(Fill(i, c), Fill(j, c))
+    p += ':- fill(1,"r").'
+    p += ':- fill(1,"r").'
+    return p
+
+
+def _models(problem):
+    result = SolverWrapper().solve(problem, options=["0"])
+    return sorted([sorted(answer._answer_set) for answer in result.answers])
+
+
+def _optimal_models(problem):
+    result = SolverWrapper().solve(problem, options=["0", "--opt-mode=optN"])
+    best = result.answers[-1].costs
+    return {frozenset(answer._answer_set) for answer in result.answers if answer.costs == best}
+
+
+def test_lift_keeps_models():
+    p = _problem()
+    lifted = p.lift()
+    assert "_pyspel_lift0" in str(lifted)
+    assert str(lifted).count(':- fill(1,"r").') == 2
+    assert len(lifted.rules) < len(p.rules)
+    models = _models(p)
+    assert len(models) == 1
+    assert _models(lifted) == models
+    assert not any(a.startswith("_pyspel_") for model in _models(lifted) for a in model)
+
+
+def _weighted():
+    p = Problem()
+    p += [Spot(i) for i in range(1, 5)]
+    for i in range(1, 5):
+        p += Guess({Fill(i, "r"), Fill(i, "g")}, exactly=1)
+    for i in range(1, 4):
+        p += Assert(Fill(i, "r"), Fill(i + 1, "r"))
+        p += Assert(~Fill(i, "g")).otherwise(i, 1, i)
+    return p
+
+
+def test_lift_keeps_optimal_models():
+    p = _weighted()
+    lifted = p.lift()
+    assert len(lifted.rules) < len(p.rules)
+    expected = SolverWrapper().solve(p)
+    result = SolverWrapper().solve(lifted)
+    assert result.answers[-1].costs == expected.answers[-1].costs
+    assert _optimal_models(lifted) == _optimal_models(p)
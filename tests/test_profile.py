@@ -0,0 +1,48 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+
+@atom
+class Seed:
+    value: int
+
+
+@atom
+class Grow:
+    value: int
+
+
+def _problem():
+    p = Problem()
+    p += [Seed(i) for i in range(1, 4)]
+    for i in range(1, 3):
+        with Seed() as s:
+            p += When(s, s.value > i).define(Grow(s.value))
+    return p
+
+
+def test_rule_sources_are_recorded_only_when_enabled():
+    assert all(rule.source is None for rule in _problem().rules)
+    enable_rule_sources()
+    try:
+        rules = _problem().rules
+    finally:
+        disable_rule_sources()
+    assert all(rule.source[0] == __file__ for rule in rules)
+    assert len(set(rule.source for rule in rules)) == 2
+
+
+@pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+def test_profile_grounding_groups_by_source():
+    enable_rule_sources()
+    try:
+        p = _problem()
+    finally:
+        disable_rule_sources()
+    profile = p.profile_grounding()
+    assert sorted((entry.rules, entry.instances) for entry in profile.entries) == [(2, 3), (3, 3)]
+    profile = _problem().profile_grounding()
+    assert sorted((entry.rules, entry.instances) for entry in profile.entries) == [(1, 1), (1, 1), (1, 1), (1, 1), (1, 2)]
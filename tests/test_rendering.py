@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+from pyspel.pyspel import *
+
+_program = """
+from pyspel.pyspel import *
+
+@atom
+class Dot:
+    value: int
+
+@atom
+class Shade:
+    value: str
+
+@atom
+class Mark:
+    dot: Dot
+    shade: Shade
+
+p = Problem()
+shades = [Shade(name) for name in ["red", "green", "blue", "cyan", "plum"]]
+for dot in [Dot(i) for i in range(3)]:
+    p += Guess({Mark(dot, shade) for shade in shades}, exactly=1)
+    p += Assert(Count({Mark(dot, shade) for shade in shades}) == 1)
+print(p)
+"""
+
+
+def test_set_rendering_does_not_depend_on_hash_seed():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    outputs = set()
+    for seed in range(4):
+        env = dict(os.environ, PYTHONHASHSEED=str(seed), PYTHONPATH=root)
+        outputs.add(subprocess.run([sys.executable, "-c", _program], env=env, capture_output=True, text=True, check=True).stdout)
+    assert len(outputs) == 1
+
+
+@atom
+class Box:
+    size: int
+    tag: str
+
+
+def test_rule_rendering():
+    assert str(When(Box(1, "X_1"), Box(2, "b")).holds(False)) == ' :- box(1, "X_1"); box(2, "b").'
+    assert str(When(Box(1, "a"), Term(1) < Term(2)).holds(False)) == ' :- box(1, "a").'
+    assert str(When(Box(1, "a"), Term(2) < Term(1)).holds(False)) == ''
+    with Box() as b:
+        assert str(When(b, b.size > 1).holds(False)) == ' :- box(X0, X1); X0 > 1.'
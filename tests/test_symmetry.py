@@ -0,0 +1,69 @@
+import itertools
+import re
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+pytestmark = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class Knot:
+    value: int
+
+
+@atom
+class Hue:
+    name: str
+
+
+@atom
+class Link:
+    first: Knot
+    second: Knot
+
+
+@atom
+class Dye:
+    knot: Knot
+    hue: Hue
+
+
+_hues = ["red", "green", "blue"]
+
+
+def _problem():
+    p = Problem()
+    p += [Knot(i) for i in range(1, 4)]
+    p += [Hue(name) for name in _hues]
+    p += [Link(Knot(1), Knot(2)), Link(Knot(2), Knot(3))]
+    with Knot() as k, Hue() as h:
+        p += When(k).guess({Dye(k, h): h}, exactly=1)
+    with Knot() as a, Knot() as b, Hue() as h:
+        p += When(Dye(a, h), Dye(b, h), Link(a, b)).holds(False)
+    return p
+
+
+def _models(problem):
+    result = SolverWrapper().solve(problem, options=["0"])
+    return [frozenset(answer._answer_set) for answer in result.answers]
+
+
+def _permute(model, permutation):
+    return frozenset([re.sub(r'hue\("(\w+)"\)', lambda m: f'hue("{permutation[_hues.index(m.group(1))]}")', a) for a in model])
+
+
+def test_break_symmetries_keeps_one_model_per_class():
+    p = _problem()
+    (broken, report) = p.break_symmetries()
+    assert len(report) == 1
+    models = set(_models(p))
+    reduced = _models(broken)
+    assert len(models) == 12
+    assert 0 < len(reduced) < len(models)
+    assert set(reduced) <= models
+    assert not any(a.startswith("_pyspel_") for model in reduced for a in model)
+    for model in models:
+        assert any(_permute(model, permutation) in reduced for permutation in itertools.permutations(_hues))
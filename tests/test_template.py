@@ -0,0 +1,54 @@
+import shutil
+
+import pytest
+
+from pyspel.pyspel import *
+
+
+@atom
+class Vertex:
+    value: int
+
+
+@atom
+class Paint:
+    vertex: int
+    color: str
+
+
+_colors = ["red", "green", "blue"]
+_edges = [(1, 2), (2, 3), (1, 3), (3, 4)]
+
+
+def _constraint(i, j, c):
+    return When(Paint(i, c), Paint(j, c)).holds(False)
+
+
+def _problem(template):
+    p = Problem()
+    p += [Vertex(i) for i in range(1, 5)]
+    with Vertex() as v:
+        p += When(v).guess({Paint(v.value, c) for c in _colors}, exactly=1)
+    rows = [(i, j, c) for (i, j) in _edges for c in _colors]
+    if template:
+        p += RuleTemplate(_constraint).render(rows)
+    else:
+        p += [_constraint(*row) for row in rows]
+    return p
+
+
+def test_template_matches_direct_rules():
+    template = RuleTemplate(_constraint)
+    for row in [(1, 2, "red"), (3, 4, 'say "hi"')]:
+        assert template.format(*row) == str(_constraint(*row))
+    assert str(template) == ' :- paint($0, $2); paint($1, $2).'
+
+
+@pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+def test_template_has_the_same_models():
+    models = []
+    for template in (False, True):
+        result = SolverWrapper().solve(_problem(template), options=["0"])
+        models.append(sorted([sorted(answer._answer_set) for answer in result.answers]))
+    assert len(models[0]) == 12
+    assert models[0] == models[1]
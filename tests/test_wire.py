@@ -0,0 +1,84 @@
+import json
+import pickle
+import shutil
+import zlib
+
+import pytest
+
+from pyspel.pyspel import *
+
+requires_clingo = pytest.mark.skipif(shutil.which("clingo") is None, reason="clingo is not installed")
+
+
+@atom
+class City:
+    name: str
+    size: int
+
+
+@atom
+class Road:
+    start: City
+    end: City
+
+
+@atom
+class Visit:
+    city: City
+
+
+def _problem():
+    p = Problem()
+    cities = [City("rome", 3), City("milan", 2), City("naples", 1)]
+    p += cities
+    p += [Road(cities[0], cities[1]), Road(cities[1], cities[2])]
+    with City() as c:
+        p += Guess({Visit(c): c}, exactly=1)
+    with City() as c:
+        p += Assert(~Visit(c)).when(c).otherwise(c.size, 1, c.name)
+    return p
+
+
+class _Payload:
+
+    def __reduce__(self):
+        return exec, ("raise RuntimeError('executed')",)
+
+
+def test_payload_is_structured_data():
+    data = _problem().to_bytes(compress=False)
+    header = data[:len("PYSPEL") + 3]
+    assert json.loads(data[len(header):])[1][0] == {"atom": "City", "fields": {"name": "rome", "size": 3}}
+
+
+def test_rejects_pickled_payload():
+    data = zlib.compress(pickle.dumps(_Payload()))
+    with pytest.raises(ValueError):
+        Problem.from_bytes(b"PYSPEL" + bytes([2, ord("P"), 1]) + data)
+
+
+def test_atoms_are_rebuilt_through_their_classes():
+    atom_ = Road(City("rome", 3), City("milan", 2))
+    copy = pickle.loads(pickle.dumps(atom_))
+    assert type(copy) is Road and type(copy.start) is City
+    assert str(copy) == str(atom_)
+    problem = Problem.from_bytes(_problem().to_bytes())
+    assert [str(rule) for rule in problem.rules[:5]] == [str(rule) for rule in _problem().rules[:5]]
+    assert type(problem.rules[3]._head[0]) is Road
+
+
+def test_unknown_atoms_are_rendered():
+    data = _problem().to_bytes(compress=False).replace(b'"City"', b'"Town"')
+    assert str(Problem.from_bytes(data)).startswith('town("rome", 3).\ntown("milan", 2).\n')
+
+
+@requires_clingo
+def test_solve_round_trip():
+    problem = _problem()
+    result = SolverWrapper().solve(Problem.from_bytes(problem.to_bytes()), stopping=TargetCost(1))
+    expected = SolverWrapper().solve(problem)
+    assert result.status == Result.HAS_SOLUTION
+    assert result.answers[-1].costs == expected.answers[-1].costs == [1]
+    copy = Result.from_bytes(result.to_bytes())
+    assert type(copy.stopped_by) is TargetCost and copy.stopped_by.cost == [1]
+    assert [str(a) for a in copy.answers[-1].get_atom_occurrences(Visit())] == ['visit(city("naples", 1))']